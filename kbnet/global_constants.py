@@ -68,6 +68,9 @@ W_WEIGHT_DECAY_POSE = 0.00
 MIN_EVALUATE_DEPTH = 0.00
 MAX_EVALUATE_DEPTH = 100.0
 
+# Quantization settings
+N_SAMPLE_CALIBRATION = 100
+
 # Checkpoint settings
 CHECKPOINT_PATH = "trained_kbnet"
 N_CHECKPOINT = 5000
@@ -75,6 +78,7 @@ N_SUMMARY = 5000
 N_SUMMARY_DISPLAY = 4
 VALIDATION_START_STEP = 200000
 RESTORE_PATH = None
+QUANTIZED_ENCODER_PATH = "kbnet_encoder_int8.pt2"
 
 # Hardware settings
 CUDA = "cuda"
@@ -83,3 +87,5 @@ GPU = "gpu"
 DEVICE = "cuda"
 DEVICE_AVAILABLE = [CPU, CUDA, GPU]
 N_THREAD = 8
+CUDNN_BENCHMARK = True
+DISTRIBUTED = False
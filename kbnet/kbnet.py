@@ -19,7 +19,7 @@ import numpy as np
 import torch
 from PIL import Image
 from torch.utils.tensorboard import SummaryWriter
-from kbnet import datasets, data_utils, eval_utils
+from kbnet import datasets, data_utils, eval_utils, net_utils
 from kbnet.log_utils import log
 from kbnet.kbnet_model import KBNetModel
 from kbnet.posenet_model import PoseNetModel
@@ -93,13 +93,40 @@ def train(
     # Hardware settings
     device=settings.DEVICE,
     n_thread=settings.N_THREAD,
+    cudnn_benchmark=settings.CUDNN_BENCHMARK,
+    distributed=settings.DISTRIBUTED,
+    use_pose_side_stream=False,
+    use_mixed_precision=False,
+    use_channels_last=False,
+    use_intrinsics_side_stream=False,
+    use_gradient_checkpointing=False,
 ):
     if device == settings.CUDA or device == settings.GPU:
         device = torch.device(settings.CUDA)
     else:
         device = torch.device(settings.CPU)
 
-    if not os.path.exists(checkpoint_path):
+    if distributed:
+        # Expects one process per GPU, e.g. launched by torchrun which sets LOCAL_RANK
+        torch.distributed.init_process_group(
+            backend="nccl" if device.type == settings.CUDA else "gloo"
+        )
+
+        if device.type == settings.CUDA:
+            device = torch.device(settings.CUDA, int(os.environ["LOCAL_RANK"]))
+            torch.cuda.set_device(device)
+
+        n_process = torch.distributed.get_world_size()
+        is_main_process = torch.distributed.get_rank() == 0
+    else:
+        n_process = 1
+        is_main_process = True
+
+    # Training crops have the same shape every step, so let cuDNN search once for
+    # the fastest algorithm of each convolution (first steps are slower)
+    torch.backends.cudnn.benchmark = cudnn_benchmark
+
+    if is_main_process and not os.path.exists(checkpoint_path):
         os.makedirs(checkpoint_path)
 
     # Set up checkpoint and event paths
@@ -129,20 +156,31 @@ def train(
     assert len(train_sparse_depth_paths) == n_train_sample
     assert len(train_intrinsics_paths) == n_train_sample
 
-    n_train_step = learning_schedule[-1] * np.ceil(n_train_sample / n_batch).astype(
-        np.int32
+    # Batch size is per process, so each process takes 1 / n_process of the samples
+    n_train_step = learning_schedule[-1] * np.ceil(
+        n_train_sample / (n_batch * n_process)
+    ).astype(np.int32)
+
+    train_dataset = datasets.KBNetTrainingDataset(
+        image_paths=train_image_paths,
+        sparse_depth_paths=train_sparse_depth_paths,
+        intrinsics_paths=train_intrinsics_paths,
+        shape=(n_height, n_width),
+        random_crop_type=augmentation_random_crop_type,
     )
 
+    if distributed:
+        train_sampler = torch.utils.data.distributed.DistributedSampler(
+            train_dataset, shuffle=True
+        )
+    else:
+        train_sampler = None
+
     train_dataloader = torch.utils.data.DataLoader(
-        datasets.KBNetTrainingDataset(
-            image_paths=train_image_paths,
-            sparse_depth_paths=train_sparse_depth_paths,
-            intrinsics_paths=train_intrinsics_paths,
-            shape=(n_height, n_width),
-            random_crop_type=augmentation_random_crop_type,
-        ),
+        train_dataset,
         batch_size=n_batch,
-        shuffle=True,
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
         num_workers=n_thread,
         drop_last=False,
     )
@@ -219,6 +257,11 @@ def train(
         activation_func=activation_func,
         min_predict_depth=min_predict_depth,
         max_predict_depth=max_predict_depth,
+        use_mixed_precision=use_mixed_precision,
+        use_channels_last=use_channels_last,
+        use_side_stream=use_intrinsics_side_stream,
+        use_gradient_checkpointing=use_gradient_checkpointing,
+        distributed=distributed,
         device=device,
     )
 
@@ -232,6 +275,9 @@ def train(
         rotation_parameterization="axis",
         weight_initializer=weight_initializer,
         activation_func="relu",
+        use_mixed_precision=use_mixed_precision,
+        use_channels_last=use_channels_last,
+        distributed=distributed,
         device=device,
     )
 
@@ -245,123 +291,125 @@ def train(
     if pose_model_restore_path is not None and pose_model_restore_path != "":
         pose_model.restore_model(pose_model_restore_path)
 
-    # Set up tensorboard summary writers
-    train_summary_writer = SummaryWriter(event_path + "-train")
-    val_summary_writer = SummaryWriter(event_path + "-val")
-
-    """
-    Log input paths
-    """
-    log("Training input paths:", log_path)
-    train_input_paths = [
-        train_image_path,
-        train_sparse_depth_path,
-        train_intrinsics_path,
-    ]
-    for path in train_input_paths:
-        log(path, log_path)
-    log("", log_path)
+    # Only the main process writes summaries, logs and checkpoints
+    if is_main_process:
+        # Set up tensorboard summary writers
+        train_summary_writer = SummaryWriter(event_path + "-train")
+        val_summary_writer = SummaryWriter(event_path + "-val")
+
+        """
+        Log input paths
+        """
+        log("Training input paths:", log_path)
+        train_input_paths = [
+            train_image_path,
+            train_sparse_depth_path,
+            train_intrinsics_path,
+        ]
+        for path in train_input_paths:
+            log(path, log_path)
+        log("", log_path)
 
-    log("Validation input paths:", log_path)
-    val_input_paths = [
-        val_image_path,
-        val_sparse_depth_path,
-        val_intrinsics_path,
-        val_ground_truth_path,
-    ]
-    for path in val_input_paths:
-        log(path, log_path)
-    log("", log_path)
+        log("Validation input paths:", log_path)
+        val_input_paths = [
+            val_image_path,
+            val_sparse_depth_path,
+            val_intrinsics_path,
+            val_ground_truth_path,
+        ]
+        for path in val_input_paths:
+            log(path, log_path)
+        log("", log_path)
 
-    """
-    Log all settings
-    """
-    log_input_settings(
-        log_path,
-        # Batch settings
-        n_batch=n_batch,
-        n_height=n_height,
-        n_width=n_width,
-        # Input settings
-        input_channels_image=input_channels_image,
-        input_channels_depth=input_channels_depth,
-        normalized_image_range=normalized_image_range,
-        outlier_removal_kernel_size=outlier_removal_kernel_size,
-        outlier_removal_threshold=outlier_removal_threshold,
-    )
+        """
+        Log all settings
+        """
+        log_input_settings(
+            log_path,
+            # Batch settings
+            n_batch=n_batch,
+            n_height=n_height,
+            n_width=n_width,
+            # Input settings
+            input_channels_image=input_channels_image,
+            input_channels_depth=input_channels_depth,
+            normalized_image_range=normalized_image_range,
+            outlier_removal_kernel_size=outlier_removal_kernel_size,
+            outlier_removal_threshold=outlier_removal_threshold,
+        )
 
-    log_network_settings(
-        log_path,
-        # Sparse to dense pool settings
-        min_pool_sizes_sparse_to_dense_pool=min_pool_sizes_sparse_to_dense_pool,
-        max_pool_sizes_sparse_to_dense_pool=max_pool_sizes_sparse_to_dense_pool,
-        n_convolution_sparse_to_dense_pool=n_convolution_sparse_to_dense_pool,
-        n_filter_sparse_to_dense_pool=n_filter_sparse_to_dense_pool,
-        # Depth network settings
-        n_filters_encoder_image=n_filters_encoder_image,
-        n_filters_encoder_depth=n_filters_encoder_depth,
-        resolutions_backprojection=resolutions_backprojection,
-        n_filters_decoder=n_filters_decoder,
-        deconv_type=deconv_type,
-        min_predict_depth=min_predict_depth,
-        max_predict_depth=max_predict_depth,
-        # Weight settings
-        weight_initializer=weight_initializer,
-        activation_func=activation_func,
-        parameters_depth_model=parameters_depth_model,
-        parameters_pose_model=parameters_pose_model,
-    )
+        log_network_settings(
+            log_path,
+            # Sparse to dense pool settings
+            min_pool_sizes_sparse_to_dense_pool=min_pool_sizes_sparse_to_dense_pool,
+            max_pool_sizes_sparse_to_dense_pool=max_pool_sizes_sparse_to_dense_pool,
+            n_convolution_sparse_to_dense_pool=n_convolution_sparse_to_dense_pool,
+            n_filter_sparse_to_dense_pool=n_filter_sparse_to_dense_pool,
+            # Depth network settings
+            n_filters_encoder_image=n_filters_encoder_image,
+            n_filters_encoder_depth=n_filters_encoder_depth,
+            resolutions_backprojection=resolutions_backprojection,
+            n_filters_decoder=n_filters_decoder,
+            deconv_type=deconv_type,
+            min_predict_depth=min_predict_depth,
+            max_predict_depth=max_predict_depth,
+            # Weight settings
+            weight_initializer=weight_initializer,
+            activation_func=activation_func,
+            parameters_depth_model=parameters_depth_model,
+            parameters_pose_model=parameters_pose_model,
+        )
 
-    log_training_settings(
-        log_path,
-        # Training settings
-        n_batch=n_batch,
-        n_train_sample=n_train_sample,
-        n_train_step=n_train_step,
-        learning_rates=learning_rates,
-        learning_schedule=learning_schedule,
-        # Augmentation settings
-        augmentation_probabilities=augmentation_probabilities,
-        augmentation_schedule=augmentation_schedule,
-        augmentation_random_crop_type=augmentation_random_crop_type,
-        augmentation_random_flip_type=augmentation_random_flip_type,
-        augmentation_random_remove_points=augmentation_random_remove_points,
-        augmentation_random_noise_type=augmentation_random_noise_type,
-        augmentation_random_noise_spread=augmentation_random_noise_spread,
-    )
+        log_training_settings(
+            log_path,
+            # Training settings
+            n_batch=n_batch,
+            n_train_sample=n_train_sample,
+            n_train_step=n_train_step,
+            learning_rates=learning_rates,
+            learning_schedule=learning_schedule,
+            # Augmentation settings
+            augmentation_probabilities=augmentation_probabilities,
+            augmentation_schedule=augmentation_schedule,
+            augmentation_random_crop_type=augmentation_random_crop_type,
+            augmentation_random_flip_type=augmentation_random_flip_type,
+            augmentation_random_remove_points=augmentation_random_remove_points,
+            augmentation_random_noise_type=augmentation_random_noise_type,
+            augmentation_random_noise_spread=augmentation_random_noise_spread,
+        )
 
-    log_loss_func_settings(
-        log_path,
-        # Loss function settings
-        w_color=w_color,
-        w_structure=w_structure,
-        w_sparse_depth=w_sparse_depth,
-        w_smoothness=w_smoothness,
-        w_weight_decay_depth=w_weight_decay_depth,
-        w_weight_decay_pose=w_weight_decay_pose,
-    )
+        log_loss_func_settings(
+            log_path,
+            # Loss function settings
+            w_color=w_color,
+            w_structure=w_structure,
+            w_sparse_depth=w_sparse_depth,
+            w_smoothness=w_smoothness,
+            w_weight_decay_depth=w_weight_decay_depth,
+            w_weight_decay_pose=w_weight_decay_pose,
+        )
 
-    log_evaluation_settings(
-        log_path,
-        min_evaluate_depth=min_evaluate_depth,
-        max_evaluate_depth=max_evaluate_depth,
-    )
+        log_evaluation_settings(
+            log_path,
+            min_evaluate_depth=min_evaluate_depth,
+            max_evaluate_depth=max_evaluate_depth,
+        )
 
-    log_system_settings(
-        log_path,
-        # Checkpoint settings
-        checkpoint_path=checkpoint_path,
-        n_checkpoint=n_checkpoint,
-        summary_event_path=event_path,
-        n_summary=n_summary,
-        n_summary_display=n_summary_display,
-        validation_start_step=validation_start_step,
-        depth_model_restore_path=depth_model_restore_path,
-        pose_model_restore_path=pose_model_restore_path,
-        # Hardware settings
-        device=device,
-        n_thread=n_thread,
-    )
+        log_system_settings(
+            log_path,
+            # Checkpoint settings
+            checkpoint_path=checkpoint_path,
+            n_checkpoint=n_checkpoint,
+            summary_event_path=event_path,
+            n_summary=n_summary,
+            n_summary_display=n_summary_display,
+            validation_start_step=validation_start_step,
+            depth_model_restore_path=depth_model_restore_path,
+            pose_model_restore_path=pose_model_restore_path,
+            # Hardware settings
+            device=device,
+            n_thread=n_thread,
+        )
 
     """
     Train model
@@ -381,12 +429,30 @@ def train(
         lr=learning_rate,
     )
 
+    # Automatic mixed precision only runs on CUDA devices
+    grad_scaler = net_utils.grad_scaler(
+        enabled=use_mixed_precision and device.type == settings.CUDA
+    )
+
+    # Pose network does not depend on depth network, so it can run on a side CUDA
+    # stream while depth network runs on the current stream
+    if use_pose_side_stream and device.type == settings.CUDA:
+        pose_stream = torch.cuda.Stream(device)
+    else:
+        pose_stream = None
+
     # Start training
     train_step = 0
     time_start = time.time()
 
-    log("Begin training...", log_path)
+    if is_main_process:
+        log("Begin training...", log_path)
+
     for epoch in range(1, learning_schedule[-1] + 1):
+        # Reshuffle the partition of samples across processes
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
+
         # Set learning rate schedule
         if epoch > learning_schedule[learning_schedule_pos]:
             learning_schedule_pos = learning_schedule_pos + 1
@@ -415,9 +481,7 @@ def train(
             image0, image1, image2, sparse_depth0, intrinsics = inputs
 
             # Validity map is where sparse depth is available
-            validity_map_depth0 = torch.where(
-                sparse_depth0 > 0, torch.ones_like(sparse_depth0), sparse_depth0
-            )
+            validity_map_depth0 = sparse_depth0.masked_fill(sparse_depth0 > 0, 1.0)
 
             # Remove outlier points and update sparse depth and validity map
             (
@@ -442,7 +506,16 @@ def train(
                 random_transform_probability=augmentation_probability,
             )
 
-            # Forward through the network
+            # Side stream must wait for augmented images to be written
+            if pose_stream is not None:
+                pose_stream.wait_stream(torch.cuda.current_stream(device))
+
+            # Forward through the network, pose is queued first so that it overlaps
+            # with depth. A stream of None leaves the current stream unchanged
+            with torch.cuda.stream(pose_stream):
+                pose01 = pose_model.forward(image0, image1)
+                pose02 = pose_model.forward(image0, image2)
+
             output_depth0 = depth_model.forward(
                 image=image0,
                 sparse_depth=sparse_depth0,
@@ -450,8 +523,17 @@ def train(
                 intrinsics=intrinsics,
             )
 
-            pose01 = pose_model.forward(image0, image1)
-            pose02 = pose_model.forward(image0, image2)
+            # Wait for pose before it is consumed by the loss
+            if pose_stream is not None:
+                current_stream = torch.cuda.current_stream(device)
+                current_stream.wait_stream(pose_stream)
+
+                # Memory used across streams must not be reused until both are done
+                pose01.record_stream(current_stream)
+                pose02.record_stream(current_stream)
+
+                for image in [image0, image1, image2]:
+                    image.record_stream(pose_stream)
 
             # Compute loss function
             loss, loss_info = depth_model.compute_loss(
@@ -470,12 +552,14 @@ def train(
                 w_smoothness=w_smoothness,
             )
 
-            # Compute gradient and backpropagate
+            # Compute gradient and backpropagate, loss is scaled so that gradients
+            # of float16 activations do not underflow, no-op without mixed precision
             optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
+            grad_scaler.scale(loss).backward()
+            grad_scaler.step(optimizer)
+            grad_scaler.update()
 
-            if (train_step % n_summary) == 0:
+            if (train_step % n_summary) == 0 and is_main_process:
                 image01 = loss_info.pop("image01")
                 image02 = loss_info.pop("image02")
 
@@ -496,7 +580,7 @@ def train(
                 )
 
             # Log results and save checkpoints
-            if (train_step % n_checkpoint) == 0:
+            if (train_step % n_checkpoint) == 0 and is_main_process:
                 time_elapse = (time.time() - time_start) / 3600
                 time_remain = (n_train_step - train_step) * time_elapse / train_step
 
@@ -543,13 +627,17 @@ def train(
                 )
 
     # Save checkpoints
-    depth_model.save_model(
-        depth_model_checkpoint_path.format(train_step), train_step, optimizer
-    )
+    if is_main_process:
+        depth_model.save_model(
+            depth_model_checkpoint_path.format(train_step), train_step, optimizer
+        )
 
-    pose_model.save_model(
-        pose_model_checkpoint_path.format(train_step), train_step, optimizer
-    )
+        pose_model.save_model(
+            pose_model_checkpoint_path.format(train_step), train_step, optimizer
+        )
+
+    if distributed:
+        torch.distributed.destroy_process_group()
 
 
 def validate(
@@ -591,9 +679,7 @@ def validate(
         ground_truth = torch.from_numpy(ground_truth).to(device)
 
         # Validity map is where sparse depth is available
-        validity_map_depth = torch.where(
-            sparse_depth > 0, torch.ones_like(sparse_depth), sparse_depth
-        )
+        validity_map_depth = sparse_depth.masked_fill(sparse_depth > 0, 1.0)
 
         # Remove outlier points and update sparse depth and validity map
         (
@@ -768,6 +854,13 @@ def run(
     keep_input_filenames=False,
     # Hardware settings
     device=settings.DEVICE,
+    use_bfloat16=False,
+    use_mixed_precision=False,
+    use_channels_last=False,
+    use_intrinsics_side_stream=False,
+    reuse_concat_buffers=False,
+    cudnn_benchmark=False,
+    compile_decoder=False,
 ):
     # Set up output path
     if device == settings.CUDA or device == settings.GPU:
@@ -775,6 +868,12 @@ def run(
     else:
         device = torch.device(settings.CPU)
 
+    # cuDNN searches for the fastest algorithm of each convolution for every new
+    # input shape, so only enable it if all samples share one resolution (KITTI
+    # images vary in size). Convolutions already allow TF32, matrix multiplies do
+    # not as they backproject coordinates
+    torch.backends.cudnn.benchmark = cudnn_benchmark
+
     if not os.path.exists(checkpoint_path):
         os.makedirs(checkpoint_path)
 
@@ -852,6 +951,10 @@ def run(
         activation_func=activation_func,
         min_predict_depth=min_predict_depth,
         max_predict_depth=max_predict_depth,
+        use_mixed_precision=use_mixed_precision,
+        use_channels_last=use_channels_last,
+        use_side_stream=use_intrinsics_side_stream,
+        reuse_concat_buffers=reuse_concat_buffers,
         device=device,
     )
 
@@ -861,6 +964,12 @@ def run(
 
     parameters_depth_model = depth_model.parameters()
 
+    # Count parameters before fusing as fused stem weights are zero padded
+    depth_model.fuse_for_inference()
+
+    if use_bfloat16:
+        depth_model.convert_to_bfloat16()
+
     """
     Log input paths
     """
@@ -951,30 +1060,46 @@ def run(
 
         time_start = time.time()
 
-        # Validity map is where sparse depth is available
-        validity_map_depth = torch.where(
-            sparse_depth > 0, torch.ones_like(sparse_depth), sparse_depth
-        )
+        # Outputs are never backpropagated, so also skip version counter and view
+        # tracking of tensors. Validation during training keeps no_grad as cached
+        # coordinates created here could not be reused in training
+        with torch.inference_mode():
+            # Validity map is where sparse depth is available
+            validity_map_depth = sparse_depth.masked_fill(sparse_depth > 0, 1.0)
 
-        # Remove outlier points and update sparse depth and validity map
-        (
-            filtered_sparse_depth,
-            filtered_validity_map_depth,
-        ) = outlier_removal.remove_outliers(
-            sparse_depth=sparse_depth, validity_map=validity_map_depth
-        )
+            # Remove outlier points and update sparse depth and validity map
+            (
+                filtered_sparse_depth,
+                filtered_validity_map_depth,
+            ) = outlier_removal.remove_outliers(
+                sparse_depth=sparse_depth, validity_map=validity_map_depth
+            )
 
-        [image] = transforms.transform(
-            images_arr=[image], random_transform_probability=0.0
-        )
+            [image] = transforms.transform(
+                images_arr=[image], random_transform_probability=0.0
+            )
 
-        # Forward through network
-        output_depth = depth_model.forward(
-            image=image,
-            sparse_depth=sparse_depth,
-            validity_map_depth=filtered_validity_map_depth,
-            intrinsics=intrinsics,
-        )
+            # Compile decoder once for the resolution of the first sample, other
+            # resolutions recompile, so leave compilation out of the run time
+            if compile_decoder and idx == 0:
+                time_compile_start = time.time()
+
+                depth_model.compile_decoder(
+                    image=image,
+                    sparse_depth=sparse_depth,
+                    validity_map_depth=filtered_validity_map_depth,
+                    intrinsics=intrinsics,
+                )
+
+                time_start = time_start + (time.time() - time_compile_start)
+
+            # Forward through network
+            output_depth = depth_model.forward(
+                image=image,
+                sparse_depth=sparse_depth,
+                validity_map_depth=filtered_validity_map_depth,
+                intrinsics=intrinsics,
+            )
 
         time_elapse = time_elapse + (time.time() - time_start)
 
@@ -1101,6 +1226,173 @@ def run(
                 data_utils.save_depth(ground_truth[..., 0], ground_truth_path)
 
 
+def quantize(
+    image_path,
+    sparse_depth_path,
+    intrinsics_path,
+    # Input settings
+    input_channels_image=settings.INPUT_CHANNELS_IMAGE,
+    input_channels_depth=settings.INPUT_CHANNELS_DEPTH,
+    normalized_image_range=settings.NORMALIZED_IMAGE_RANGE,
+    outlier_removal_kernel_size=settings.OUTLIER_REMOVAL_KERNEL_SIZE,
+    outlier_removal_threshold=settings.OUTLIER_REMOVAL_THRESHOLD,
+    # Sparse to dense pool settings
+    min_pool_sizes_sparse_to_dense_pool=settings.MIN_POOL_SIZES_SPARSE_TO_DENSE_POOL,
+    max_pool_sizes_sparse_to_dense_pool=settings.MAX_POOL_SIZES_SPARSE_TO_DENSE_POOL,
+    n_convolution_sparse_to_dense_pool=settings.N_CONVOLUTION_SPARSE_TO_DENSE_POOL,
+    n_filter_sparse_to_dense_pool=settings.N_FILTER_SPARSE_TO_DENSE_POOL,
+    # Depth network settings
+    n_filters_encoder_image=settings.N_FILTERS_ENCODER_IMAGE,
+    n_filters_encoder_depth=settings.N_FILTERS_ENCODER_DEPTH,
+    resolutions_backprojection=settings.RESOLUTIONS_BACKPROJECTION,
+    n_filters_decoder=settings.N_FILTERS_DECODER,
+    deconv_type=settings.DECONV_TYPE,
+    min_predict_depth=settings.MIN_PREDICT_DEPTH,
+    max_predict_depth=settings.MAX_PREDICT_DEPTH,
+    # Weight settings
+    weight_initializer=settings.WEIGHT_INITIALIZER,
+    activation_func=settings.ACTIVATION_FUNC,
+    # Quantization settings
+    n_sample_calibration=settings.N_SAMPLE_CALIBRATION,
+    # Checkpoint settings
+    depth_model_restore_path=settings.RESTORE_PATH,
+    quantized_encoder_path=settings.QUANTIZED_ENCODER_PATH,
+):
+    # Post training quantization with PT2E lives in torchao since PyTorch 2.10
+    try:
+        from torchao.quantization.pt2e.quantize_pt2e import prepare_pt2e, convert_pt2e
+        from torchao.quantization.pt2e.quantizer import x86_inductor_quantizer
+    except ImportError:
+        from torch.ao.quantization.quantize_pt2e import prepare_pt2e, convert_pt2e
+        from torch.ao.quantization.quantizer import x86_inductor_quantizer
+
+    # X86 Inductor quantizer targets int8 convolutions on CPU (VNNI, AMX)
+    device = torch.device(settings.CPU)
+
+    """
+    Load input paths and set up dataloader
+    """
+    image_paths = data_utils.read_paths(image_path)
+    sparse_depth_paths = data_utils.read_paths(sparse_depth_path)
+    intrinsics_paths = data_utils.read_paths(intrinsics_path)
+
+    n_sample = len(image_paths)
+
+    for paths in [sparse_depth_paths, intrinsics_paths]:
+        assert n_sample == len(paths)
+
+    dataloader = torch.utils.data.DataLoader(
+        datasets.KBNetInferenceDataset(
+            image_paths=image_paths,
+            sparse_depth_paths=sparse_depth_paths,
+            intrinsics_paths=intrinsics_paths,
+        ),
+        batch_size=1,
+        shuffle=False,
+        num_workers=1,
+        drop_last=False,
+    )
+
+    transforms = Transforms(normalized_image_range=normalized_image_range)
+
+    outlier_removal = OutlierRemoval(
+        kernel_size=outlier_removal_kernel_size, threshold=outlier_removal_threshold
+    )
+
+    """
+    Set up the model
+    """
+    depth_model = KBNetModel(
+        input_channels_image=input_channels_image,
+        input_channels_depth=input_channels_depth,
+        min_pool_sizes_sparse_to_dense_pool=min_pool_sizes_sparse_to_dense_pool,
+        max_pool_sizes_sparse_to_dense_pool=max_pool_sizes_sparse_to_dense_pool,
+        n_convolution_sparse_to_dense_pool=n_convolution_sparse_to_dense_pool,
+        n_filter_sparse_to_dense_pool=n_filter_sparse_to_dense_pool,
+        n_filters_encoder_image=n_filters_encoder_image,
+        n_filters_encoder_depth=n_filters_encoder_depth,
+        resolutions_backprojection=resolutions_backprojection,
+        n_filters_decoder=n_filters_decoder,
+        deconv_type=deconv_type,
+        weight_initializer=weight_initializer,
+        activation_func=activation_func,
+        min_predict_depth=min_predict_depth,
+        max_predict_depth=max_predict_depth,
+        device=device,
+    )
+
+    depth_model.restore_model(depth_model_restore_path)
+    depth_model.eval()
+
+    encoder = depth_model.encoder.module
+
+    # Coordinates buffers are kept in Python dicts that cannot be exported
+    encoder.reuse_coordinates_buffers = False
+
+    """
+    Calibrate and quantize encoder
+    """
+
+    def encoder_inputs(inputs):
+        image, sparse_depth, intrinsics = [in_.to(device) for in_ in inputs]
+
+        # Same preprocessing as run
+        validity_map_depth = sparse_depth.masked_fill(sparse_depth > 0, 1.0)
+
+        _, filtered_validity_map_depth = outlier_removal.remove_outliers(
+            sparse_depth=sparse_depth, validity_map=validity_map_depth
+        )
+
+        [image] = transforms.transform(
+            images_arr=[image], random_transform_probability=0.0
+        )
+
+        input_depth = depth_model.sparse_to_dense_pool(
+            torch.cat([sparse_depth, filtered_validity_map_depth], dim=1)
+        )
+
+        return image, input_depth, intrinsics
+
+    n_sample_calibration = min(n_sample_calibration, n_sample)
+
+    with torch.no_grad():
+        calibration_inputs = []
+
+        for inputs in dataloader:
+            calibration_inputs.append(encoder_inputs(inputs))
+
+            if len(calibration_inputs) == n_sample_calibration:
+                break
+
+        # Exported graphs are specialized to the shape of the example inputs
+        example_inputs = calibration_inputs[0]
+
+        exported = torch.export.export(encoder, example_inputs).module()
+
+        quantizer = x86_inductor_quantizer.X86InductorQuantizer()
+        quantizer.set_global(
+            x86_inductor_quantizer.get_default_x86_inductor_quantization_config()
+        )
+
+        # Observers record the range of activations over calibration samples
+        prepared = prepare_pt2e(exported, quantizer)
+
+        for inputs in calibration_inputs:
+            prepared(*inputs)
+
+        quantized = convert_pt2e(prepared)
+
+        torch.export.save(
+            torch.export.export(quantized, example_inputs), quantized_encoder_path
+        )
+
+    log(
+        "Saved encoder quantized with {} calibration samples to {}".format(
+            n_sample_calibration, quantized_encoder_path
+        )
+    )
+
+
 """
 Helper functions for logging
 """
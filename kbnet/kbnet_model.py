@@ -47,7 +47,7 @@ class KBNetModel(object):
         n_filters_decoder : list[int]
             number of filters to use in each block of depth decoder
         deconv_type : str
-            deconvolution types: transpose, up
+            deconvolution types: transpose, up, subpixel
         weight_initializer : str
             kaiming_normal, kaiming_uniform, xavier_normal, xavier_uniform
         activation_func : str
@@ -56,6 +56,20 @@ class KBNetModel(object):
             minimum predicted depth
         max_predict_depth : float
             maximum predicted depth
+        use_mixed_precision : bool
+            if set, then run convolutions of encoder in float16 with automatic mixed
+            precision, training must scale the loss e.g. with net_utils.grad_scaler
+        use_channels_last : bool
+            if set, then run convolutions in channels last (N x H x W x C) memory format
+        use_side_stream : bool
+            if set, then invert intrinsics on a side CUDA stream in the encoder
+        use_gradient_checkpointing : bool
+            if set, then recompute activations of decoder in backward, only for training
+        reuse_concat_buffers : bool
+            if set, then concatenate skip connections of decoder into buffers kept from
+            previous calls, only applies when gradients are not needed
+        distributed : bool
+            if set, then use DistributedDataParallel (one process per GPU)
         device : torch.device
             device for running model
     """
@@ -77,6 +91,12 @@ class KBNetModel(object):
         activation_func="leaky_relu",
         min_predict_depth=1.5,
         max_predict_depth=100.0,
+        use_mixed_precision=False,
+        use_channels_last=False,
+        use_side_stream=False,
+        use_gradient_checkpointing=False,
+        reuse_concat_buffers=False,
+        distributed=False,
         device=torch.device("cuda"),
     ):
         self.min_predict_depth = min_predict_depth
@@ -84,6 +104,9 @@ class KBNetModel(object):
 
         self.device = device
 
+        # Type of features in encoder and decoder, see convert_to_bfloat16
+        self.dtype = torch.float32
+
         # Build sparse to dense pooling
         self.sparse_to_dense_pool = networks.SparseToDensePool(
             input_channels=input_channels_depth,
@@ -93,6 +116,7 @@ class KBNetModel(object):
             n_filter=n_filter_sparse_to_dense_pool,
             weight_initializer=weight_initializer,
             activation_func=activation_func,
+            use_channels_last=use_channels_last,
         )
 
         # Set up number of input and skip channels
@@ -124,6 +148,10 @@ class KBNetModel(object):
             resolutions_backprojection=resolutions_backprojection,
             weight_initializer=weight_initializer,
             activation_func=activation_func,
+            use_mixed_precision=use_mixed_precision,
+            use_channels_last=use_channels_last,
+            concatenate_skips=False,
+            use_side_stream=use_side_stream,
         )
 
         self.decoder = networks.MultiScaleDecoder(
@@ -137,11 +165,18 @@ class KBNetModel(object):
             output_func="linear",
             use_batch_norm=False,
             deconv_type=deconv_type,
+            use_channels_last=use_channels_last,
+            use_gradient_checkpointing=use_gradient_checkpointing,
+            reuse_concat_buffers=reuse_concat_buffers,
         )
 
         # Move to device
-        self.data_parallel()
-        self.to(self.device)
+        if distributed:
+            self.to(self.device)
+            self.distributed_data_parallel()
+        else:
+            self.data_parallel()
+            self.to(self.device)
 
     def forward(self, image, sparse_depth, validity_map_depth, intrinsics):
         """
@@ -170,9 +205,11 @@ class KBNetModel(object):
 
         # Forward through the network
         shape = input_depth.shape[-2:]
-        latent, skips = self.encoder(image, input_depth, intrinsics)
+        latent, skips = self.encoder(
+            image.to(self.dtype), input_depth.to(self.dtype), intrinsics
+        )
 
-        output = self.decoder(latent, skips, shape)[-1]
+        output = self.decoder(latent, skips, shape)[-1].float()
 
         output_depth = torch.sigmoid(output)
 
@@ -333,6 +370,75 @@ class KBNetModel(object):
         self.encoder.eval()
         self.decoder.eval()
 
+    def fuse_for_inference(self):
+        """
+        Fuses layers of the model for inference, model must not be trained after
+        """
+
+        # Image and depth stem convolutions of the encoder
+        self.encoder.module.fuse_stem_convolutions()
+
+        # Batch normalization into convolutions, before fusing them with ReLU
+        net_utils.fuse_convolution_batch_norm(self.sparse_to_dense_pool)
+        net_utils.fuse_convolution_batch_norm(self.encoder)
+        net_utils.fuse_convolution_batch_norm(self.decoder)
+
+        # Convolutions followed by ReLU
+        net_utils.fuse_convolution_activation(self.sparse_to_dense_pool)
+        net_utils.fuse_convolution_activation(self.encoder)
+        net_utils.fuse_convolution_activation(self.decoder)
+
+    def compile_decoder(
+        self, image, sparse_depth, validity_map_depth, intrinsics, mode="max-autotune"
+    ):
+        """
+        Compiles decoder for the shapes of the example inputs, inputs of other shapes
+        recompile, so only use it for inference at a fixed resolution
+
+        Arg(s):
+            image : torch.Tensor[float32]
+                N x 3 x H x W image
+            sparse_depth : torch.Tensor[float32]
+                N x 1 x H x W sparse depth
+            validity_map_depth : torch.Tensor[float32]
+                N x 1 x H x W validity map of sparse depth
+            intrinsics : torch.Tensor[float32]
+                N x 3 x 3 camera intrinsics matrix
+            mode : str
+                torch.compile mode: default, reduce-overhead, max-autotune
+        """
+
+        input_depth = torch.cat([sparse_depth, validity_map_depth], dim=1)
+
+        input_depth = self.sparse_to_dense_pool(input_depth)
+
+        # Same encoder inputs as forward, so decoder sees the shapes it will run on
+        shape = input_depth.shape[-2:]
+        latent, skips = self.encoder(
+            image.to(self.dtype), input_depth.to(self.dtype), intrinsics
+        )
+
+        self.decoder.module.compile_for_shape(latent, skips, shape=shape, mode=mode)
+
+    def convert_to_bfloat16(self):
+        """
+        Converts weights of encoder and decoder to bfloat16 for inference, which halves
+        their memory and runs without casting them on every forward pass like automatic
+        mixed precision. Sparse to dense pooling stays in float32 to keep the precision
+        of sparse depth. Model cannot be trained or converted back to float32 after,
+        restore it from a checkpoint instead
+        """
+
+        self.encoder.to(dtype=torch.bfloat16)
+        self.decoder.to(dtype=torch.bfloat16)
+
+        # Keep normalization statistics in float32
+        for module in list(self.encoder.modules()) + list(self.decoder.modules()):
+            if isinstance(module, torch.nn.modules.batchnorm._BatchNorm):
+                module.float()
+
+        self.dtype = torch.bfloat16
+
     def to(self, device):
         """
         Moves model to specified device
@@ -415,6 +521,30 @@ class KBNetModel(object):
         self.encoder = torch.nn.DataParallel(self.encoder)
         self.decoder = torch.nn.DataParallel(self.decoder)
 
+    def distributed_data_parallel(self):
+        """
+        Allows multi-gpu split along batch with one process per GPU,
+        requires the default process group to be initialized
+        """
+
+        device_ids = None if self.device.type == "cpu" else [self.device]
+
+        # Validation runs only on the first process, so buffers must not be synced
+        self.sparse_to_dense_pool = torch.nn.parallel.DistributedDataParallel(
+            self.sparse_to_dense_pool, device_ids=device_ids, broadcast_buffers=False
+        )
+        # Image branch of the last resolution does not feed the latent, so its
+        # parameters get no gradient and must not be waited on in reduction
+        self.encoder = torch.nn.parallel.DistributedDataParallel(
+            self.encoder,
+            device_ids=device_ids,
+            broadcast_buffers=False,
+            find_unused_parameters=True,
+        )
+        self.decoder = torch.nn.parallel.DistributedDataParallel(
+            self.decoder, device_ids=device_ids, broadcast_buffers=False
+        )
+
     def log_summary(
         self,
         summary_writer,
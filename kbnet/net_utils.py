@@ -14,15 +14,20 @@ https://arxiv.org/pdf/2108.10531.pdf
   year={2021}
 }
 """
+import contextlib
+import functools
 import torch
+from typing import Dict, List, Optional
 
 
 EPSILON = 1e-10
 
 
+@functools.lru_cache(maxsize=8)
 def activation_func(activation_fn):
     """
-    Select activation function
+    Select activation function. Activation functions are stateless, so one instance
+    per name is shared by every layer and network that selects it
 
     Arg(s):
         activation_fn : str
@@ -45,6 +50,69 @@ def activation_func(activation_fn):
         raise ValueError("Unsupported activation function: {}".format(activation_fn))
 
 
+def instance_norm(n_channel):
+    """
+    Instance normalization, i.e. normalizes each channel of each sample over its
+    height and width, as group normalization with one group per channel. Unlike
+    InstanceNorm2d, which reshapes inputs to run batch normalization, it runs as one
+    fused kernel and supports channels last (NHWC) tensors without a copy
+
+    Arg(s):
+        n_channel : int
+            number of channels
+    Returns:
+        torch.nn.Module : instance normalization without learned parameters
+    """
+
+    return torch.nn.GroupNorm(n_channel, n_channel, affine=False)
+
+
+def autocast(enabled=True, dtype=torch.float16):
+    """
+    Select CUDA automatic mixed precision context, falls back to a no-op context
+    for versions of PyTorch without automatic mixed precision
+
+    Arg(s):
+        enabled : bool
+            if set, then run eligible operations in dtype, otherwise disable
+            any enclosing automatic mixed precision region
+        dtype : torch.dtype
+            float16, or bfloat16 which requires torch.autocast (PyTorch 1.10)
+    Returns:
+        context manager : automatic mixed precision context
+    """
+
+    if not enabled and not torch.is_autocast_enabled():
+        # Disabling outside of an enabled region is a no-op, so return a context
+        # that torch.export does not need to capture
+        return contextlib.nullcontext()
+    elif hasattr(torch, "autocast"):
+        return torch.autocast("cuda", enabled=enabled, dtype=dtype)
+    elif hasattr(torch.cuda, "amp") and hasattr(torch.cuda.amp, "autocast"):
+        assert dtype == torch.float16, "Only float16 is supported by torch.cuda.amp"
+        return torch.cuda.amp.autocast(enabled=enabled)
+    else:
+        return contextlib.nullcontext()
+
+
+def grad_scaler(enabled=True):
+    """
+    Select CUDA gradient scaler for training with float16 automatic mixed precision,
+    which scales the loss so that small gradients do not underflow in float16
+
+    Arg(s):
+        enabled : bool
+            if set, then scale loss and gradients, otherwise steps are unchanged
+    Returns:
+        torch.amp.GradScaler : gradient scaler
+    """
+
+    if hasattr(torch, "amp") and hasattr(torch.amp, "GradScaler"):
+        return torch.amp.GradScaler("cuda", enabled=enabled)
+    else:
+        return torch.cuda.amp.GradScaler(enabled=enabled)
+
+
 """
 Network layers
 """
@@ -73,6 +141,9 @@ class Conv2d(torch.nn.Module):
             if set, then apply instance normalization
     """
 
+    # Allows TorchScript to compile out normalization layers that are not built
+    __constants__ = ["use_batch_norm", "use_instance_norm"]
+
     def __init__(
         self,
         in_channels,
@@ -123,7 +194,7 @@ class Conv2d(torch.nn.Module):
         if use_batch_norm:
             self.batch_norm = torch.nn.BatchNorm2d(out_channels)
         elif use_instance_norm:
-            self.instance_norm = torch.nn.InstanceNorm2d(out_channels)
+            self.instance_norm = instance_norm(out_channels)
 
     def forward(self, x):
         """
@@ -149,6 +220,159 @@ class Conv2d(torch.nn.Module):
             return conv
 
 
+class FusedConv2dReLU(torch.nn.Module):
+    """
+    Convolution followed by ReLU that runs as a single cuDNN kernel in evaluation
+    mode, replaces Conv2d layers without normalization for inference. Keeps the
+    convolution as conv so that state dict keys are unchanged
+
+    Arg(s):
+        conv2d : Conv2d
+            convolution layer with ReLU activation and without normalization
+    """
+
+    def __init__(self, conv2d):
+        super(FusedConv2dReLU, self).__init__()
+
+        self.conv = conv2d.conv
+        self.activation_func = conv2d.activation_func
+
+    def forward(self, x):
+        """
+        Forward input x through convolution and ReLU
+
+        Arg(s):
+            x : torch.Tensor[float32]
+                N x C x H x W input tensor
+        Returns:
+            torch.Tensor[float32] : N x K x h x w output tensor
+        """
+
+        # cuDNN kernel does not cast inputs, so it is skipped under autocast or if
+        # input and weights differ in type
+        use_fused_kernel = (
+            not self.training
+            and x.is_cuda
+            and not torch.is_autocast_enabled()
+            and x.dtype == self.conv.weight.dtype
+        )
+
+        if use_fused_kernel:
+            return torch.cudnn_convolution_relu(
+                x,
+                self.conv.weight,
+                self.conv.bias,
+                list(self.conv.stride),
+                list(self.conv.padding),
+                list(self.conv.dilation),
+                self.conv.groups,
+            )
+
+        return self.activation_func(self.conv(x))
+
+
+def fuse_convolution_activation(module):
+    """
+    Replaces convolutions followed directly by ReLU with FusedConv2dReLU, which runs
+    them as a single cuDNN kernel in evaluation mode. cuDNN only fuses ReLU, so
+    convolutions followed by normalization or other activation functions e.g.
+    LeakyReLU are left as they are
+
+    Arg(s):
+        module : torch.nn.Module
+            network containing Conv2d layers
+    Returns:
+        int : number of fused convolutions
+    """
+
+    if not hasattr(torch, "cudnn_convolution_relu"):
+        return 0
+
+    n_fused = 0
+
+    # Collect first, as children cannot be replaced while iterating over modules
+    for parent in list(module.modules()):
+        for name, m in list(parent.named_children()):
+            if not isinstance(m, Conv2d):
+                continue
+
+            if m.use_batch_norm or m.use_instance_norm:
+                continue
+
+            if type(m.activation_func) is torch.nn.ReLU:
+                setattr(parent, name, FusedConv2dReLU(m))
+                n_fused = n_fused + 1
+
+    return n_fused
+
+
+def fuse_convolution_batch_norm(module):
+    """
+    Folds batch normalization into the preceding convolution using its running
+    statistics, removing a pass over each feature map. Fused convolutions have no
+    batch normalization, so they may also be fused with ReLU afterwards. Module must
+    be in evaluation mode and must not be trained after
+
+    Arg(s):
+        module : torch.nn.Module
+            network containing Conv2d, AtrousConv2d or DepthwiseSeparableConv2d layers
+    Returns:
+        int : number of fused convolutions
+    """
+
+    n_fused = 0
+
+    for m in list(module.modules()):
+        if not isinstance(m, (Conv2d, AtrousConv2d, DepthwiseSeparableConv2d)):
+            continue
+
+        if not m.use_batch_norm:
+            continue
+
+        if isinstance(m, DepthwiseSeparableConv2d):
+            # Batch normalization follows the pointwise convolution
+            m.conv_pointwise = torch.nn.utils.fusion.fuse_conv_bn_eval(
+                m.conv_pointwise, m.batch_norm
+            )
+            m.conv = torch.nn.Sequential(m.conv_depthwise, m.conv_pointwise)
+        else:
+            m.conv = torch.nn.utils.fusion.fuse_conv_bn_eval(m.conv, m.batch_norm)
+
+        m.use_batch_norm = False
+        del m.batch_norm
+
+        n_fused = n_fused + 1
+
+    return n_fused
+
+
+def depthwise_separable_channels_last(module):
+    """
+    Switches depthwise separable convolutions to channels last (NHWC) layout. Grouped
+    convolutions with one group per channel are poorly coalesced on NCHW tensors, while
+    cuDNN has dedicated depthwise kernels for NHWC tensors
+
+    Arg(s):
+        module : torch.nn.Module
+            network containing DepthwiseSeparableConv2d layers
+    Returns:
+        int : number of converted convolutions
+    """
+
+    n_converted = 0
+
+    for m in module.modules():
+        if not isinstance(m, DepthwiseSeparableConv2d):
+            continue
+
+        m.conv.to(memory_format=torch.channels_last)
+        m.use_channels_last = True
+
+        n_converted = n_converted + 1
+
+    return n_converted
+
+
 class DepthwiseSeparableConv2d(torch.nn.Module):
     """
     Depthwise separable convolution class
@@ -165,6 +389,8 @@ class DepthwiseSeparableConv2d(torch.nn.Module):
             size of kernel (k x k)
         stride : int
             stride of convolution
+        dilation : int
+            dilation of depthwise convolution (skips rate - 1 pixels)
         weight_initializer : str
             kaiming_normal, kaiming_uniform, xavier_normal, xavier_uniform
         activation_func : func
@@ -173,6 +399,8 @@ class DepthwiseSeparableConv2d(torch.nn.Module):
             if set, then apply batch normalization
         use_instance_norm : bool
             if set, then apply instance normalization
+        use_channels_last : bool
+            if set, then run convolutions on channels last (NHWC) tensors
     """
 
     def __init__(
@@ -181,14 +409,16 @@ class DepthwiseSeparableConv2d(torch.nn.Module):
         out_channels,
         kernel_size=3,
         stride=1,
+        dilation=1,
         weight_initializer="kaiming_uniform",
         activation_func=torch.nn.LeakyReLU(negative_slope=0.10, inplace=True),
         use_batch_norm=False,
         use_instance_norm=False,
+        use_channels_last=False,
     ):
         super(DepthwiseSeparableConv2d, self).__init__()
 
-        padding = kernel_size // 2
+        padding = dilation * (kernel_size // 2)
 
         self.conv_depthwise = torch.nn.Conv2d(
             in_channels,
@@ -196,6 +426,7 @@ class DepthwiseSeparableConv2d(torch.nn.Module):
             kernel_size=kernel_size,
             stride=stride,
             padding=padding,
+            dilation=dilation,
             bias=False,
             groups=in_channels,
         )
@@ -233,10 +464,15 @@ class DepthwiseSeparableConv2d(torch.nn.Module):
         if use_batch_norm:
             self.batch_norm = torch.nn.BatchNorm2d(out_channels)
         elif use_instance_norm:
-            self.instance_norm = torch.nn.InstanceNorm2d(out_channels)
+            self.instance_norm = instance_norm(out_channels)
 
         self.activation_func = activation_func
 
+        self.use_channels_last = use_channels_last
+
+        if use_channels_last:
+            self.conv.to(memory_format=torch.channels_last)
+
     def forward(self, x):
         """
         Forward input x through a depthwise convolution layer
@@ -248,6 +484,9 @@ class DepthwiseSeparableConv2d(torch.nn.Module):
             torch.Tensor[float32] : N x K x h x w output tensor
         """
 
+        if self.use_channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+
         conv = self.conv(x)
 
         if self.use_batch_norm:
@@ -335,7 +574,7 @@ class AtrousConv2d(torch.nn.Module):
         if use_batch_norm:
             self.batch_norm = torch.nn.BatchNorm2d(out_channels)
         elif use_instance_norm:
-            self.instance_norm = torch.nn.InstanceNorm2d(out_channels)
+            self.instance_norm = instance_norm(out_channels)
 
     def forward(self, x):
         """
@@ -432,7 +671,7 @@ class TransposeConv2d(torch.nn.Module):
         if use_batch_norm:
             self.batch_norm = torch.nn.BatchNorm2d(out_channels)
         elif use_instance_norm:
-            self.instance_norm = torch.nn.InstanceNorm2d(out_channels)
+            self.instance_norm = instance_norm(out_channels)
 
     def forward(self, x):
         """
@@ -522,6 +761,108 @@ class UpConv2d(torch.nn.Module):
         return conv
 
 
+class SubpixelConv2d(torch.nn.Module):
+    """
+    Sub-pixel convolution class, upsamples by 2 by convolving to 4 times the output
+    channels and rearranging them into 2 x 2 blocks of pixels with pixel shuffle
+
+    Arg(s):
+        in_channels : int
+            number of input channels
+        out_channels : int
+            number of output channels
+        kernel_size : int
+            size of kernel (k x k)
+        weight_initializer : str
+            kaiming_normal, kaiming_uniform, xavier_normal, xavier_uniform
+        activation_func : func
+            activation function after convolution
+        use_batch_norm : bool
+            if set, then apply batch normalization
+        use_instance_norm : bool
+            if set, then apply instance normalization
+    """
+
+    def __init__(
+        self,
+        in_channels,
+        out_channels,
+        kernel_size=3,
+        weight_initializer="kaiming_uniform",
+        activation_func=torch.nn.LeakyReLU(negative_slope=0.10, inplace=True),
+        use_batch_norm=False,
+        use_instance_norm=False,
+    ):
+        super(SubpixelConv2d, self).__init__()
+
+        padding = kernel_size // 2
+
+        self.conv = torch.nn.Conv2d(
+            in_channels,
+            4 * out_channels,
+            kernel_size=kernel_size,
+            stride=1,
+            padding=padding,
+            bias=False,
+        )
+
+        # Select the type of weight initialization, by default kaiming_uniform
+        if weight_initializer == "kaiming_normal":
+            torch.nn.init.kaiming_normal_(self.conv.weight)
+        elif weight_initializer == "xavier_normal":
+            torch.nn.init.xavier_normal_(self.conv.weight)
+        elif weight_initializer == "xavier_uniform":
+            torch.nn.init.xavier_uniform_(self.conv.weight)
+        elif weight_initializer == "kaiming_uniform":
+            pass
+        else:
+            raise ValueError(
+                "Unsupported weight initializer: {}".format(weight_initializer)
+            )
+
+        # Share weights within each 2 x 2 block (ICNR), so that it starts as
+        # convolution followed by nearest upsampling, without checkerboard artifacts
+        with torch.no_grad():
+            self.conv.weight.copy_(self.conv.weight[::4].repeat_interleave(4, dim=0))
+
+        self.activation_func = activation_func
+
+        assert not (
+            use_batch_norm and use_instance_norm
+        ), "Unable to apply both batch and instance normalization"
+
+        self.use_batch_norm = use_batch_norm
+        self.use_instance_norm = use_instance_norm
+
+        if use_batch_norm:
+            self.batch_norm = torch.nn.BatchNorm2d(out_channels)
+        elif use_instance_norm:
+            self.instance_norm = instance_norm(out_channels)
+
+    def forward(self, x):
+        """
+        Forward input x through a sub-pixel convolution layer
+
+        Arg(s):
+            x : torch.Tensor[float32]
+                N x C x h x w input tensor
+        Returns:
+            torch.Tensor[float32] : N x K x 2h x 2w output tensor
+        """
+
+        deconv = torch.nn.functional.pixel_shuffle(self.conv(x), upscale_factor=2)
+
+        if self.use_batch_norm:
+            deconv = self.batch_norm(deconv)
+        elif self.use_instance_norm:
+            deconv = self.instance_norm(deconv)
+
+        if self.activation_func is not None:
+            return self.activation_func(deconv)
+        else:
+            return deconv
+
+
 class FullyConnected(torch.nn.Module):
     """
     Fully connected layer
@@ -1114,6 +1455,8 @@ class AtrousSpatialPyramidPooling(torch.nn.Module):
             if set, then apply batch normalization
         use_instance_norm : bool
             if set, then apply instance normalization
+        use_depthwise_separable : bool
+            if set, then use depthwise separable atrous convolutions for each branch
     """
 
     def __init__(
@@ -1125,6 +1468,7 @@ class AtrousSpatialPyramidPooling(torch.nn.Module):
         activation_func=torch.nn.LeakyReLU(negative_slope=0.10, inplace=True),
         use_batch_norm=False,
         use_instance_norm=False,
+        use_depthwise_separable=False,
     ):
         super(AtrousSpatialPyramidPooling, self).__init__()
 
@@ -1146,16 +1490,29 @@ class AtrousSpatialPyramidPooling(torch.nn.Module):
         self.atrous_convs = torch.nn.ModuleList()
 
         for dilation in dilations:
-            atrous_conv = AtrousConv2d(
-                in_channels,
-                output_channels,
-                kernel_size=3,
-                dilation=dilation,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-                use_batch_norm=use_batch_norm,
-                use_instance_norm=use_instance_norm,
-            )
+            if use_depthwise_separable:
+                atrous_conv = DepthwiseSeparableConv2d(
+                    in_channels,
+                    output_channels,
+                    kernel_size=3,
+                    dilation=dilation,
+                    weight_initializer=weight_initializer,
+                    activation_func=activation_func,
+                    use_batch_norm=use_batch_norm,
+                    use_instance_norm=use_instance_norm,
+                )
+            else:
+                atrous_conv = AtrousConv2d(
+                    in_channels,
+                    output_channels,
+                    kernel_size=3,
+                    dilation=dilation,
+                    weight_initializer=weight_initializer,
+                    activation_func=activation_func,
+                    use_batch_norm=use_batch_norm,
+                    use_instance_norm=use_instance_norm,
+                )
+
             self.atrous_convs.append(atrous_conv)
 
         # Global pooling
@@ -1330,6 +1687,72 @@ class SpatialPyramidPooling(torch.nn.Module):
         return self.conv_fuse(torch.cat(branches, dim=1))
 
 
+@torch.jit.script
+def max_pool2d_cascade(x: torch.Tensor, kernel_sizes: List[int]):
+    """
+    Max pools inputs with stride 1 and different odd kernel sizes by pooling the
+    result of the next smaller kernel size with the difference in kernel sizes,
+    e.g. 9 x 9 as 3 x 3 pooling of 7 x 7, instead of pooling inputs with each
+    kernel size. Scripted so that the loop runs without Python overhead
+
+    Arg(s):
+        x : torch.Tensor[float32]
+            N x C x H x W input
+        kernel_sizes : list[int]
+            list of odd kernel sizes s (kernel size is s x s)
+    Returns:
+        list[torch.Tensor[float32]] : list of N x C x H x W max pooled tensors
+    """
+
+    # Windows are clipped to the input, so pooling twice covers the same pixels
+    x_pools: Dict[int, torch.Tensor] = {}
+    x_pool = x
+    kernel_size_pool = 1
+
+    for s in sorted(kernel_sizes):
+        if s != kernel_size_pool:
+            x_pool = torch.nn.functional.max_pool2d(
+                x_pool,
+                kernel_size=s - kernel_size_pool + 1,
+                stride=1,
+                padding=(s - kernel_size_pool) // 2,
+            )
+            kernel_size_pool = s
+
+        x_pools[s] = x_pool
+
+    return [x_pools[s] for s in kernel_sizes]
+
+
+@torch.jit.script
+def min_pool2d_nonzero(z: torch.Tensor, kernel_sizes: List[int]):
+    """
+    Min pools sparse inputs over non-zero values with different kernel sizes,
+    windows without any non-zero values are set to zero. Scripted so that masking
+    is fused with pooling and the masked input is shared by all kernel sizes
+
+    Arg(s):
+        z : torch.Tensor[float32]
+            N x 1 x H x W sparse input
+        kernel_sizes : list[int]
+            list of odd kernel sizes s (kernel size is s x s)
+    Returns:
+        list[torch.Tensor[float32]] : list of N x 1 x H x W min pooled tensors
+    """
+
+    # Max pool on -z with zeros set to -inf, so they are never selected
+    z_negative = torch.neg(z).masked_fill_(z == 0, float("-inf"))
+
+    z_pools = []
+    for z_pool in max_pool2d_cascade(z_negative, kernel_sizes):
+        # Negate and clear windows without any non-zero values, which remain at
+        # inf, pooled results are inputs of larger kernel sizes so negate a copy
+        z_pool = torch.neg(z_pool)
+        z_pools.append(z_pool.masked_fill_(z_pool == float("inf"), 0.0))
+
+    return z_pools
+
+
 class CalibratedBackprojectionBlock(torch.nn.Module):
     """
     Calibrated backprojection (KB) layer class
@@ -1412,35 +1835,58 @@ class CalibratedBackprojectionBlock(torch.nn.Module):
         )
 
     def forward(self, image, depth, coordinates, fused=None):
-        layers_fused = []
-
         # Obtain image (RGB) features
         conv_image = self.conv_image(image)
 
         # Obtain depth (Z) features
         conv_depth = self.conv_depth(torch.cat([depth, coordinates], dim=1))
 
-        # Include image (RGB) features
-        layers_fused.append(image)
-
         # Project depth features to 1 dimension
         z = self.proj_depth(depth)
 
-        # Include backprojected 3D positional (XYZ) encoding: K^-1 [x y 1] z
-        xyz = coordinates * z
-        layers_fused.append(xyz)
-
-        # Include previous RGBXYZ representation
-        if fused is not None:
-            layers_fused.append(fused)
+        # Concatenate image (RGB) features, backprojected 3D positional (XYZ)
+        # encoding K^-1 [x y 1] z and previous RGBXYZ representation
+        layers_fused = backproject_and_concatenate(image, coordinates, z, fused)
 
         # Obtain fused (RGBXYZ) representation
-        layers_fused = torch.cat(layers_fused, dim=1)
         conv_fused = self.conv_fused(layers_fused)
 
         return conv_image, conv_depth, conv_fused
 
 
+@torch.jit.script
+def backproject_and_concatenate(
+    image: torch.Tensor,
+    coordinates: torch.Tensor,
+    z: torch.Tensor,
+    fused: Optional[torch.Tensor] = None,
+):
+    """
+    Backprojects coordinates by z and concatenates them with image features (and
+    previous fused features if given). Scripted so that the multiply and
+    concatenation can be fused into a single kernel
+
+    Arg(s):
+        image : torch.Tensor[float32]
+            N x C x H x W image features
+        coordinates : torch.Tensor[float32]
+            N x 3 x H x W normalized camera coordinates K^-1 [x y 1]
+        z : torch.Tensor[float32]
+            N x 1 x H x W projected depth features
+        fused : torch.Tensor[float32]
+            N x F x H x W previous RGBXYZ representation
+    Returns:
+        torch.Tensor[float32] : N x (C + 3 (+ F)) x H x W tensor
+    """
+
+    xyz = coordinates * z
+
+    if fused is not None:
+        return torch.cat([image, xyz, fused], dim=1)
+    else:
+        return torch.cat([image, xyz], dim=1)
+
+
 """
 Network decoder blocks
 """
@@ -1466,9 +1912,13 @@ class DecoderBlock(torch.nn.Module):
         use_instance_norm : bool
             if set, then apply instance normalization
         deconv_type : str
-            deconvolution types: transpose, up
+            deconvolution types: transpose, up, subpixel
         use_depthwise_separable : bool
             if set, then use depthwise separable convolutions instead of convolutions
+        reuse_concat_buffers : bool
+            if set, then concatenate skip connections into buffers kept from previous
+            calls of the same shape instead of allocating new ones, only applies
+            when gradients are not needed
     """
 
     def __init__(
@@ -1482,12 +1932,18 @@ class DecoderBlock(torch.nn.Module):
         use_instance_norm=False,
         deconv_type="up",
         use_depthwise_separable=False,
+        reuse_concat_buffers=False,
     ):
         super(DecoderBlock, self).__init__()
 
         self.skip_channels = skip_channels
         self.deconv_type = deconv_type
 
+        # Concatenation buffers keyed by (N, C, H, W, device, dtype, memory format,
+        # inference mode), only used if reuse_concat_buffers is set
+        self.reuse_concat_buffers = reuse_concat_buffers
+        self.concat_buffers = {}
+
         if deconv_type == "transpose":
             self.deconv = TransposeConv2d(
                 in_channels,
@@ -1508,6 +1964,16 @@ class DecoderBlock(torch.nn.Module):
                 use_batch_norm=use_batch_norm,
                 use_instance_norm=use_instance_norm,
             )
+        elif deconv_type == "subpixel":
+            self.deconv = SubpixelConv2d(
+                in_channels,
+                out_channels,
+                kernel_size=3,
+                weight_initializer=weight_initializer,
+                activation_func=activation_func,
+                use_batch_norm=use_batch_norm,
+                use_instance_norm=use_instance_norm,
+            )
 
         concat_channels = skip_channels + out_channels
 
@@ -1527,26 +1993,32 @@ class DecoderBlock(torch.nn.Module):
             use_instance_norm=use_instance_norm,
         )
 
-    def forward(self, x, skip=None, shape=None):
+    def forward(self, x, skip=None, shape=None, projection=None):
         """
         Forward input x through a decoder block and fuse with skip connection
 
         Arg(s):
             x : torch.Tensor[float32]
                 N x C x h x w input tensor
-            skip : torch.Tensor[float32]
-                N x F x H x W skip connection
+            skip : torch.Tensor[float32] or list[torch.Tensor[float32]]
+                N x F x H x W skip connection or list of tensors whose channels
+                sum to F, concatenated together with the output of deconvolution
             shape : tuple[int]
                 height, width (H, W) tuple denoting output shape
+            projection : torch.Tensor[float32]
+                N x K x H' x W' tensor added to output of deconvolution, cropped to
+                H x W if larger
         Returns:
             torch.Tensor[float32] : N x K x H x W output tensor
         """
 
-        if self.deconv_type == "transpose":
+        skips = skip_connection_list(skip)
+
+        if self.deconv_type == "transpose" or self.deconv_type == "subpixel":
             deconv = self.deconv(x)
         elif self.deconv_type == "up":
-            if skip is not None:
-                shape = skip.shape[2:4]
+            if len(skips) > 0:
+                shape = skips[0].shape[2:4]
             elif shape is not None:
                 pass
             else:
@@ -1555,13 +2027,119 @@ class DecoderBlock(torch.nn.Module):
 
             deconv = self.deconv(x, shape=shape)
 
+        if projection is not None:
+            n_height, n_width = deconv.shape[2:4]
+            deconv = deconv + projection[:, :, :n_height, :n_width]
+
         if self.skip_channels > 0:
-            concat = torch.cat([deconv, skip], dim=1)
+            concat = [deconv] + skips
+
+            # Autograd does not support concatenating into an existing tensor
+            use_buffer = self.reuse_concat_buffers and not (
+                torch.is_grad_enabled() and any([t.requires_grad for t in concat])
+            )
+
+            if use_buffer:
+                concat = torch.cat(concat, dim=1, out=self.concat_buffer(concat))
+            else:
+                concat = torch.cat(concat, dim=1)
         else:
             concat = deconv
 
         return self.conv(concat)
 
+    def concat_buffer(self, tensors):
+        """
+        Returns buffer to concatenate output of deconvolution and skip connections
+        into, allocated on the first call for their shape
+
+        Arg(s):
+            tensors : list[torch.Tensor[float32]]
+                output of deconvolution followed by skip connections, N x C_i x H x W
+        Returns:
+            torch.Tensor[float32] : N x (sum C_i) x H x W buffer
+        """
+
+        n_batch, _, n_height, n_width = tensors[0].shape
+        n_channel = sum([t.shape[1] for t in tensors])
+
+        dtype = tensors[0].dtype
+        for t in tensors[1:]:
+            dtype = torch.promote_types(dtype, t.dtype)
+
+        # Concatenation keeps the memory format of the output of deconvolution
+        if tensors[0].is_contiguous(memory_format=torch.channels_last):
+            memory_format = torch.channels_last
+        else:
+            memory_format = torch.contiguous_format
+
+        key = (
+            n_batch,
+            n_channel,
+            n_height,
+            n_width,
+            tensors[0].device,
+            dtype,
+            memory_format,
+            torch.is_inference_mode_enabled(),
+        )
+
+        # Inference tensors cannot be written to outside inference mode, so
+        # buffers allocated in inference mode are kept apart
+        if key not in self.concat_buffers:
+            self.concat_buffers[key] = torch.empty(
+                (n_batch, n_channel, n_height, n_width),
+                device=tensors[0].device,
+                dtype=dtype,
+                memory_format=memory_format,
+            )
+
+        return self.concat_buffers[key]
+
+
+def rename_state_dict_keys(state_dict, prefix, renames):
+    """
+    Renames keys of a state dict in place, e.g. to load checkpoints saved before
+    modules were renamed
+
+    Arg(s):
+        state_dict : dict
+            state dict being loaded
+        prefix : str
+            prefix of the module in state dict
+        renames : list[tuple[str, str]]
+            pairs of old and new key prefixes relative to the module
+    """
+
+    for name_old, name_new in renames:
+        name_old = prefix + name_old
+        name_new = prefix + name_new
+
+        for key in list(state_dict.keys()):
+            if key.startswith(name_old):
+                value = state_dict.pop(key)
+                state_dict[name_new + key[len(name_old) :]] = value
+
+
+def skip_connection_list(skip):
+    """
+    Returns a skip connection as a list of tensors to be concatenated along
+    channels, so that parts of a skip connection can be concatenated only once
+
+    Arg(s):
+        skip : torch.Tensor[float32] or list[torch.Tensor[float32]]
+            N x F x H x W skip connection, list of tensors or None
+    Returns:
+        list[torch.Tensor[float32]] : list of skip connection tensors
+    """
+
+    if skip is None:
+        return []
+    elif isinstance(skip, (list, tuple)):
+        return list(skip)
+    else:
+        return [skip]
+
 
 """
 Pose regression layer
@@ -1624,9 +2202,7 @@ def transformation_from_parameters(axisangle, translation, invert=False):
 
 def get_translation_matrix(translation_vector):
     """Convert a translation vector into a 4x4 transformation matrix"""
-    T = torch.zeros(translation_vector.shape[0], 4, 4).to(
-        device=translation_vector.device
-    )
+    T = torch.zeros(translation_vector.shape[0], 4, 4, device=translation_vector.device)
 
     t = translation_vector.contiguous().view(-1, 3, 1)
 
@@ -1665,7 +2241,7 @@ def rot_from_axisangle(vec):
     yzC = y * zC
     zxC = z * xC
 
-    rot = torch.zeros((vec.shape[0], 4, 4)).to(device=vec.device)
+    rot = torch.zeros((vec.shape[0], 4, 4), device=vec.device)
 
     rot[:, 0, 0] = torch.squeeze(x * xC + ca)
     rot[:, 0, 1] = torch.squeeze(xyC - zs)
@@ -1723,6 +2299,38 @@ def meshgrid(n_batch, n_height, n_width, device, homogeneous=True):
     return grid_xy
 
 
+def invert_intrinsics(intrinsics):
+    """
+    Inverts pinhole camera intrinsics in closed form, avoiding a general batched
+    matrix inverse. Assumes intrinsics are upper triangular with last row [0, 0, 1]
+
+    Arg(s):
+        intrinsics : torch.Tensor[float32]
+            N x 3 x 3 camera intrinsics [[fx, s, cx], [0, fy, cy], [0, 0, 1]]
+    Return:
+        torch.Tensor[float32] : N x 3 x 3 inverse of camera intrinsics
+    """
+
+    f_x = intrinsics[..., 0, 0]
+    skew = intrinsics[..., 0, 1]
+    c_x = intrinsics[..., 0, 2]
+    f_y = intrinsics[..., 1, 1]
+    c_y = intrinsics[..., 1, 2]
+
+    zeros = torch.zeros_like(f_x)
+    ones = torch.ones_like(f_x)
+
+    f_xy = f_x * f_y
+
+    row0 = torch.stack(
+        [1.0 / f_x, -skew / f_xy, (skew * c_y - c_x * f_y) / f_xy], dim=-1
+    )
+    row1 = torch.stack([zeros, 1.0 / f_y, -c_y / f_y], dim=-1)
+    row2 = torch.stack([zeros, zeros, ones], dim=-1)
+
+    return torch.stack([row0, row1, row2], dim=-2)
+
+
 def backproject_to_camera(depth, intrinsics, shape):
     """
     Backprojects pixel coordinates to 3D camera coordinates
@@ -1739,17 +2347,17 @@ def backproject_to_camera(depth, intrinsics, shape):
     """
     n_batch, _, n_height, n_width = shape
 
-    # Create homogeneous coordinates [x, y, 1]
-    xy_h = meshgrid(n_batch, n_height, n_width, device=depth.device, homogeneous=True)
+    # Create homogeneous coordinates [x, y, 1], shared by all batch elements
+    xy_h = meshgrid(1, n_height, n_width, device=depth.device, homogeneous=True)
 
-    # Reshape pixel coordinates to N x 3 x (H x W)
-    xy_h = xy_h.view(n_batch, 3, -1)
+    # Reshape pixel coordinates to 1 x 3 x (H x W), broadcasted by matmul
+    xy_h = xy_h.view(1, 3, -1)
 
     # Reshape depth as N x 1 x (H x W)
     depth = depth.view(n_batch, 1, -1)
 
     # K^-1 [x, y, 1] z
-    points = torch.matmul(torch.inverse(intrinsics), xy_h) * depth
+    points = torch.matmul(invert_intrinsics(intrinsics), xy_h) * depth
 
     # Make homogeneous
     return torch.cat([points, torch.ones_like(depth)], dim=1)
@@ -1776,11 +2384,8 @@ def project_to_pixel(points, pose, intrinsics, shape):
 
     # Convert camera intrinsics to homogeneous coordinates
     column = torch.zeros([n_batch, 3, 1], device=points.device)
-    row = (
-        torch.tensor([0.0, 0.0, 0.0, 1.0], device=points.device)
-        .view(1, 1, 4)
-        .repeat(n_batch, 1, 1)
-    )
+    row = torch.zeros([n_batch, 1, 4], device=points.device)
+    row[:, :, 3] = 1.0
     intrinsics = torch.cat([intrinsics, column], dim=2)
     intrinsics = torch.cat([intrinsics, row], dim=1)
 
@@ -1868,11 +2473,7 @@ class OutlierRemoval(object):
 
         # Replace all zeros with large values
         max_value = 10 * torch.max(sparse_depth)
-        sparse_depth_max_filled = torch.where(
-            validity_map <= 0,
-            torch.full_like(sparse_depth, fill_value=max_value),
-            sparse_depth,
-        )
+        sparse_depth_max_filled = sparse_depth.masked_fill(validity_map <= 0, max_value)
 
         # For each neighborhood find the smallest value
         padding = self.kernel_size // 2
@@ -1890,15 +2491,11 @@ class OutlierRemoval(object):
             padding=0,
         )
 
-        # If measurement differs a lot from minimum value then remove
-        validity_map_clean = torch.where(
-            min_values < sparse_depth - self.threshold,
-            torch.zeros_like(validity_map),
-            torch.ones_like(validity_map),
+        # If measurement differs a lot from minimum value then remove, and update
+        # sparse depth and validity map
+        validity_map_clean = validity_map.masked_fill(
+            min_values < sparse_depth - self.threshold, 0.0
         )
-
-        # Update sparse depth and validity map
-        validity_map_clean = validity_map * validity_map_clean
         sparse_depth_clean = sparse_depth * validity_map_clean
 
         return sparse_depth_clean, validity_map_clean
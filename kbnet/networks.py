@@ -15,6 +15,7 @@ https://arxiv.org/pdf/2108.10531.pdf
 }
 """
 import torch
+import torch.utils.checkpoint
 from kbnet import net_utils
 
 
@@ -50,6 +51,20 @@ class KBNetEncoder(torch.nn.Module):
             kaiming_normal, kaiming_uniform, xavier_normal, xavier_uniform
         activation_func : func
             activation function after convolution
+        use_mixed_precision : bool
+            if set, then run convolutions in float16 with automatic mixed precision
+        use_channels_last : bool
+            if set, then run convolutions in channels last (N x H x W x C) memory format
+        concatenate_skips : bool
+            if set, then return each skip connection as a single tensor, otherwise
+            as a tuple of tensors for the decoder to concatenate in one pass
+        reuse_coordinates_buffers : bool
+            if set, then write camera coordinates into buffers kept from previous
+            calls of the same shape instead of allocating new ones, only applies
+            when gradients are not needed
+        use_side_stream : bool
+            if set, then invert intrinsics on a side CUDA stream so that it overlaps
+            with the first convolutions
     """
 
     def __init__(
@@ -65,10 +80,33 @@ class KBNetEncoder(torch.nn.Module):
         resolutions_backprojection=[0, 1, 2],
         weight_initializer="kaiming_uniform",
         activation_func="leaky_relu",
+        use_mixed_precision=False,
+        use_channels_last=False,
+        concatenate_skips=True,
+        reuse_coordinates_buffers=False,
+        use_side_stream=False,
     ):
         super(KBNetEncoder, self).__init__()
 
         self.resolutions_backprojection = resolutions_backprojection
+        self.use_mixed_precision = use_mixed_precision
+        self.use_channels_last = use_channels_last
+        self.concatenate_skips = concatenate_skips
+
+        # Pixel coordinates (x, y, 1) for each resolution, keyed by (H, W, device)
+        self.meshgrid_cache = {}
+
+        # Camera coordinates buffers keyed by (N, H, W, device, dtype, inference
+        # mode), only used if reuse_coordinates_buffers is set
+        self.reuse_coordinates_buffers = reuse_coordinates_buffers
+        self.coordinates_buffers = {}
+
+        # Side CUDA streams keyed by device, only used if use_side_stream is set
+        self.use_side_stream = use_side_stream
+        self.side_streams = {}
+
+        # Stem convolutions fused for inference, see fuse_stem_convolutions
+        self.conv0 = None
 
         network_depth = 5
 
@@ -81,14 +119,11 @@ class KBNetEncoder(torch.nn.Module):
 
         activation_func = net_utils.activation_func(activation_func)
 
-        # Resolution: 1/1 -> 1/2
-        n = 0
-
-        if n in resolutions_backprojection:
+        if 0 in resolutions_backprojection:
             # Initial feature extractors on inputs
             self.conv0_image = net_utils.Conv2d(
                 in_channels=input_channels_image,
-                out_channels=n_filters_image[n],
+                out_channels=n_filters_image[0],
                 kernel_size=3,
                 stride=1,
                 weight_initializer=weight_initializer,
@@ -97,470 +132,513 @@ class KBNetEncoder(torch.nn.Module):
 
             self.conv0_depth = net_utils.Conv2d(
                 in_channels=input_channels_depth,
-                out_channels=n_filters_depth[n],
+                out_channels=n_filters_depth[0],
                 kernel_size=3,
                 stride=1,
                 weight_initializer=weight_initializer,
                 activation_func=activation_func,
             )
 
+            in_channels_image = n_filters_image[0]
+            in_channels_depth = n_filters_depth[0]
+        else:
+            in_channels_image = input_channels_image
+            in_channels_depth = input_channels_depth
+
+        # Each stage halves resolution from 1/1 -> 1/2 up to 1/16 -> 1/32 with either
+        # calibrated backprojection or separate image and depth VGG blocks
+        self.stages = torch.nn.ModuleList()
+
+        for n in range(network_depth):
+            if n in resolutions_backprojection:
+                # Previous RGBXYZ representation is concatenated if available
+                if n - 1 in resolutions_backprojection:
+                    in_channels_fused = in_channels_image + n_filters_fused[n - 1]
+                else:
+                    in_channels_fused = in_channels_image
+
+                stage = net_utils.CalibratedBackprojectionBlock(
+                    in_channels_image=in_channels_image,
+                    in_channels_depth=in_channels_depth,
+                    in_channels_fused=in_channels_fused,
+                    n_filter_image=n_filters_image[n],
+                    n_filter_depth=n_filters_depth[n],
+                    n_filter_fused=n_filters_fused[n],
+                    n_convolution_image=n_convolutions_image[n],
+                    n_convolution_depth=n_convolutions_depth[n],
+                    n_convolution_fused=n_convolutions_fused[n],
+                    weight_initializer=weight_initializer,
+                    activation_func=activation_func,
+                )
+            else:
+                conv_image = net_utils.VGGNetBlock(
+                    in_channels=in_channels_image,
+                    out_channels=n_filters_image[n],
+                    n_convolution=n_convolutions_image[n],
+                    stride=2,
+                    weight_initializer=weight_initializer,
+                    activation_func=activation_func,
+                )
+
+                conv_depth = net_utils.VGGNetBlock(
+                    in_channels=in_channels_depth,
+                    out_channels=n_filters_depth[n],
+                    n_convolution=n_convolutions_depth[n],
+                    stride=2,
+                    weight_initializer=weight_initializer,
+                    activation_func=activation_func,
+                )
+
+                stage = torch.nn.ModuleList([conv_image, conv_depth])
+
+            self.stages.append(stage)
+
             in_channels_image = n_filters_image[n]
             in_channels_depth = n_filters_depth[n]
-            in_channels_fused = n_filters_image[n]
-
-            self.calibrated_backprojection1 = net_utils.CalibratedBackprojectionBlock(
-                in_channels_image=in_channels_image,
-                in_channels_depth=in_channels_depth,
-                in_channels_fused=in_channels_fused,
-                n_filter_image=n_filters_image[n],
-                n_filter_depth=n_filters_depth[n],
-                n_filter_fused=n_filters_fused[n],
-                n_convolution_image=n_convolutions_image[n],
-                n_convolution_depth=n_convolutions_depth[n],
-                n_convolution_fused=n_convolutions_fused[n],
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
-        else:
-            self.conv1_image = net_utils.VGGNetBlock(
-                in_channels=input_channels_image,
-                out_channels=n_filters_image[n],
-                n_convolution=n_convolutions_image[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
 
-            self.conv1_depth = net_utils.VGGNetBlock(
-                in_channels=input_channels_depth,
-                out_channels=n_filters_depth[n],
-                n_convolution=n_convolutions_depth[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+        # Map checkpoints saved with one attribute per stage to stages
+        self._register_load_state_dict_pre_hook(self.rename_stages_state_dict)
 
-        # Resolution: 1/2 -> 1/4
-        n = 1
+        if use_channels_last:
+            self.to(memory_format=torch.channels_last)
 
-        in_channels_image = n_filters_image[n - 1]
-        in_channels_depth = n_filters_depth[n - 1]
+    def rename_stages_state_dict(
+        self,
+        state_dict,
+        prefix,
+        local_metadata,
+        strict,
+        missing_keys,
+        unexpected_keys,
+        error_msgs,
+    ):
+        """
+        Renames calibrated_backprojection{1-5} and conv{1-5}_{image,depth} keys of
+        state dicts saved before stages were held in a list to stages.{0-4}
 
-        if n in resolutions_backprojection:
-            if n - 1 in resolutions_backprojection:
-                in_channels_fused = n_filters_image[n - 1] + n_filters_fused[n - 1]
-            else:
-                in_channels_fused = n_filters_image[n - 1]
-
-            self.calibrated_backprojection2 = net_utils.CalibratedBackprojectionBlock(
-                in_channels_image=in_channels_image,
-                in_channels_depth=in_channels_depth,
-                in_channels_fused=in_channels_fused,
-                n_filter_image=n_filters_image[n],
-                n_filter_depth=n_filters_depth[n],
-                n_filter_fused=n_filters_fused[n],
-                n_convolution_image=n_convolutions_image[n],
-                n_convolution_depth=n_convolutions_depth[n],
-                n_convolution_fused=n_convolutions_fused[n],
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
-        else:
-            self.conv2_image = net_utils.VGGNetBlock(
-                in_channels=in_channels_image,
-                out_channels=n_filters_image[n],
-                n_convolution=n_convolutions_image[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+        Arg(s):
+            state_dict : dict
+                state dict being loaded
+            prefix : str
+                prefix of this module in state dict
+            local_metadata : dict
+                metadata of this module
+            strict : bool
+                whether keys must match exactly
+            missing_keys : list[str]
+                keys missing from state dict
+            unexpected_keys : list[str]
+                unexpected keys in state dict
+            error_msgs : list[str]
+                error messages
+        """
 
-            self.conv2_depth = net_utils.VGGNetBlock(
-                in_channels=in_channels_depth,
-                out_channels=n_filters_depth[n],
-                n_convolution=n_convolutions_depth[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+        for n in range(len(self.stages)):
+            renames = [
+                ("calibrated_backprojection{}.".format(n + 1), "stages.{}.".format(n)),
+                ("conv{}_image.".format(n + 1), "stages.{}.0.".format(n)),
+                ("conv{}_depth.".format(n + 1), "stages.{}.1.".format(n)),
+            ]
 
-        # Resolution: 1/4 -> 1/8
-        n = 2
+            net_utils.rename_state_dict_keys(state_dict, prefix, renames)
 
-        in_channels_image = n_filters_image[n - 1]
-        in_channels_depth = n_filters_depth[n - 1]
+    def reset_coordinates_cache(self):
+        """
+        Clears cached pixel coordinates and coordinates buffers, e.g. after changing
+        datasets
+        """
 
-        if n in resolutions_backprojection:
-            if n - 1 in resolutions_backprojection:
-                in_channels_fused = n_filters_image[n - 1] + n_filters_fused[n - 1]
-            else:
-                in_channels_fused = n_filters_image[n - 1]
-
-            self.calibrated_backprojection3 = net_utils.CalibratedBackprojectionBlock(
-                in_channels_image=in_channels_image,
-                in_channels_depth=in_channels_depth,
-                in_channels_fused=in_channels_fused,
-                n_filter_image=n_filters_image[n],
-                n_filter_depth=n_filters_depth[n],
-                n_filter_fused=n_filters_fused[n],
-                n_convolution_image=n_convolutions_image[n],
-                n_convolution_depth=n_convolutions_depth[n],
-                n_convolution_fused=n_convolutions_fused[n],
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
-        else:
-            self.conv3_image = net_utils.VGGNetBlock(
-                in_channels=in_channels_image,
-                out_channels=n_filters_image[n],
-                n_convolution=n_convolutions_image[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+        self.meshgrid_cache = {}
+        self.coordinates_buffers = {}
 
-            self.conv3_depth = net_utils.VGGNetBlock(
-                in_channels=in_channels_depth,
-                out_channels=n_filters_depth[n],
-                n_convolution=n_convolutions_depth[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+    def fuse_stem_convolutions(self):
+        """
+        Fuses image and depth stem convolutions at resolution 0 into a single
+        convolution over the concatenated inputs with block diagonal weights,
+        replacing two small kernel launches with one. Inputs are zero padded to
+        a multiple of 8 channels to allow tensor core kernels. Meant for inference
+        as gradients would flow into the off diagonal blocks during training.
+        State dicts are still saved and loaded with separate stem weights
+        """
 
-        # Resolution: 1/8 -> 1/16
-        n = 3
+        if 0 not in self.resolutions_backprojection or self.conv0 is not None:
+            return
 
-        in_channels_image = n_filters_image[n - 1]
-        in_channels_depth = n_filters_depth[n - 1]
+        weight_image = self.conv0_image.conv.weight
+        weight_depth = self.conv0_depth.conv.weight
 
-        if n in resolutions_backprojection:
-            if n - 1 in resolutions_backprojection:
-                in_channels_fused = n_filters_image[n - 1] + n_filters_fused[n - 1]
-            else:
-                in_channels_fused = n_filters_image[n - 1]
-
-            self.calibrated_backprojection4 = net_utils.CalibratedBackprojectionBlock(
-                in_channels_image=in_channels_image,
-                in_channels_depth=in_channels_depth,
-                in_channels_fused=in_channels_fused,
-                n_filter_image=n_filters_image[n],
-                n_filter_depth=n_filters_depth[n],
-                n_filter_fused=n_filters_fused[n],
-                n_convolution_image=n_convolutions_image[n],
-                n_convolution_depth=n_convolutions_depth[n],
-                n_convolution_fused=n_convolutions_fused[n],
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
-        else:
-            self.conv4_image = net_utils.VGGNetBlock(
-                in_channels=in_channels_image,
-                out_channels=n_filters_image[n],
-                n_convolution=n_convolutions_image[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+        n_filter_image, in_channels_image = weight_image.shape[0:2]
+        n_filter_depth, in_channels_depth = weight_depth.shape[0:2]
 
-            self.conv4_depth = net_utils.VGGNetBlock(
-                in_channels=in_channels_depth,
-                out_channels=n_filters_depth[n],
-                n_convolution=n_convolutions_depth[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+        # Tensor cores need a multiple of 8 input channels e.g. 3 + 8 -> 16
+        in_channels = in_channels_image + in_channels_depth
+        n_channel_pad = -in_channels % 8
 
-        # Resolution: 1/16 -> 1/32
-        n = 4
+        self.conv0 = net_utils.Conv2d(
+            in_channels=in_channels + n_channel_pad,
+            out_channels=n_filter_image + n_filter_depth,
+            kernel_size=3,
+            stride=1,
+            activation_func=self.conv0_image.activation_func,
+        )
 
-        in_channels_image = n_filters_image[n - 1]
-        in_channels_depth = n_filters_depth[n - 1]
+        # Image weights map image to image features, depth to depth features
+        weight = weight_image.new_zeros(self.conv0.conv.weight.shape)
+        weight[:n_filter_image, :in_channels_image] = weight_image.detach()
+        weight[n_filter_image:, in_channels_image:in_channels] = weight_depth.detach()
+        self.conv0.conv.weight = torch.nn.Parameter(weight)
 
-        if n in resolutions_backprojection:
-            if n - 1 in resolutions_backprojection:
-                in_channels_fused = n_filters_image[n - 1] + n_filters_fused[n - 1]
-            else:
-                in_channels_fused = n_filters_image[n - 1]
-
-            self.calibrated_backprojection5 = net_utils.CalibratedBackprojectionBlock(
-                in_channels_image=in_channels_image,
-                in_channels_depth=in_channels_depth,
-                in_channels_fused=in_channels_fused,
-                n_filter_image=n_filters_image[n],
-                n_filter_depth=n_filters_depth[n],
-                n_filter_fused=n_filters_fused[n],
-                n_convolution_image=n_convolutions_image[n],
-                n_convolution_depth=n_convolutions_depth[n],
-                n_convolution_fused=n_convolutions_fused[n],
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
-        else:
-            self.conv5_image = net_utils.VGGNetBlock(
-                in_channels=in_channels_image,
-                out_channels=n_filters_image[n],
-                n_convolution=n_convolutions_image[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+        if self.use_channels_last:
+            self.conv0.to(memory_format=torch.channels_last)
 
-            self.conv5_depth = net_utils.VGGNetBlock(
-                in_channels=in_channels_depth,
-                out_channels=n_filters_depth[n],
-                n_convolution=n_convolutions_depth[n],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-            )
+        self.n_filters_stem = [n_filter_image, n_filter_depth]
+        self.in_channels_stem = [in_channels_image, in_channels_depth]
+        self.n_channel_pad_stem = n_channel_pad
 
-    def forward(self, image, depth, intrinsics):
+        del self.conv0_image
+        del self.conv0_depth
+
+        self._register_state_dict_hook(KBNetEncoder.split_stem_state_dict)
+        self._register_load_state_dict_pre_hook(self.merge_stem_state_dict)
+
+    def split_stem_state_dict(self, state_dict, prefix, local_metadata):
         """
-        Forward image, depth and calibration through encoder
+        Splits fused stem convolution weights back into image and depth weights
 
         Arg(s):
-            image : torch.Tensor[float32]
-                N x C x H x W image
-            depth : torch.Tensor[float32]
-                N x 1 x H x W depth map
-            intrinsics : torch.Tensor[float32]
-                N x C x 3 x 3 calibration
-        Returns:
-            torch.Tensor[float32] : N x K x h x w output tensor
-            list[torch.Tensor[float32]] : list of skip connections
+            state_dict : dict
+                state dict being saved
+            prefix : str
+                prefix of this module in state dict
+            local_metadata : dict
+                metadata of this module
         """
 
-        def camera_coordinates(batch, height, width, k):
-            # Reshape pixel coordinates to N x 3 x (H x W)
-            xy_h = net_utils.meshgrid(
-                n_batch=batch,
-                n_height=height,
-                n_width=width,
-                device=k.device,
-                homogeneous=True,
-            )
-            xy_h = xy_h.view(batch, 3, -1)
+        key = prefix + "conv0.conv.weight"
 
-            # K^-1 [x, y, 1] z and reshape back to N x 3 x H x W
-            coordinates = torch.matmul(torch.inverse(k), xy_h)
-            coordinates = coordinates.view(n_batch, 3, height, width)
+        if key not in state_dict:
+            return
 
-            return coordinates
+        weight = state_dict.pop(key)
+        n_filter_image, n_filter_depth = self.n_filters_stem
+        in_channels_image, in_channels_depth = self.in_channels_stem
 
-        def scale_intrinsics(batch, height0, width0, height1, width1, k):
-            device = k.device
+        state_dict[prefix + "conv0_image.conv.weight"] = weight[
+            :n_filter_image, :in_channels_image
+        ].clone()
+        state_dict[prefix + "conv0_depth.conv.weight"] = weight[
+            n_filter_image:, in_channels_image : in_channels_image + in_channels_depth
+        ].clone()
 
-            width0 = torch.tensor(width0, dtype=torch.float32, device=device)
-            height0 = torch.tensor(height0, dtype=torch.float32, device=device)
-            width1 = torch.tensor(width1, dtype=torch.float32, device=device)
-            height1 = torch.tensor(height1, dtype=torch.float32, device=device)
-
-            # Get scale in x, y components
-            scale_x = n_width1 / n_width0
-            scale_y = n_height1 / n_height0
+    def merge_stem_state_dict(
+        self,
+        state_dict,
+        prefix,
+        local_metadata,
+        strict,
+        missing_keys,
+        unexpected_keys,
+        error_msgs,
+    ):
+        """
+        Merges image and depth stem convolution weights into fused weights
 
-            # Prepare 3 x 3 matrix to do element-wise scaling
-            scale = torch.tensor(
-                [[scale_x, 1.0, scale_x], [1.0, scale_y, scale_y], [1.0, 1.0, 1.0]],
-                dtype=torch.float32,
-                device=device,
-            )
+        Arg(s):
+            state_dict : dict
+                state dict being loaded
+            prefix : str
+                prefix of this module in state dict
+            local_metadata : dict
+                metadata of this module
+            strict : bool
+                whether keys must match exactly
+            missing_keys : list[str]
+                keys missing from state dict
+            unexpected_keys : list[str]
+                unexpected keys in state dict
+            error_msgs : list[str]
+                error messages
+        """
 
-            scale = scale.view(1, 3, 3).repeat(n_batch, 1, 1)
+        key_image = prefix + "conv0_image.conv.weight"
+        key_depth = prefix + "conv0_depth.conv.weight"
 
-            return k * scale
+        if key_image not in state_dict or key_depth not in state_dict:
+            return
 
-        layers = []
+        weight_image = state_dict.pop(key_image)
+        weight_depth = state_dict.pop(key_depth)
 
-        # Resolution: 1/1 -> 1/2
-        if 0 in self.resolutions_backprojection:
-            n_batch, _, n_height0, n_width0 = image.shape
+        n_filter_image, in_channels_image = weight_image.shape[0:2]
+        in_channels = in_channels_image + weight_depth.shape[1]
 
-            # Normalized camera coordinates
-            coordinates0 = camera_coordinates(n_batch, n_height0, n_width0, intrinsics)
+        weight = weight_image.new_zeros(self.conv0.conv.weight.shape)
+        weight[:n_filter_image, :in_channels_image] = weight_image
+        weight[n_filter_image:, in_channels_image:in_channels] = weight_depth
 
-            # Feature extractors
-            conv0_image = self.conv0_image(image)
-            conv0_depth = self.conv0_depth(depth)
+        state_dict[prefix + "conv0.conv.weight"] = weight
 
-            # Calibrated backprojection
-            conv1_image, conv1_depth, conv1_fused = self.calibrated_backprojection1(
-                image=conv0_image,
-                depth=conv0_depth,
-                coordinates=coordinates0,
-                fused=None,
-            )
+    def to_traced(self, image, depth, intrinsics, freeze=False):
+        """
+        Traces encoder with example inputs into a TorchScript module to remove the
+        Python overhead of forward at inference. Call in eval mode. The result is
+        shape-specialized: control flow is recorded for the example inputs, so it
+        only holds for inputs of the same shape, and use_side_stream as well as any
+        fusing done beforehand are baked in. Save it with save(path) and load it
+        with torch.jit.load(path), the first few calls are slower while the graph
+        is optimized
 
-            skips1 = [conv1_fused, conv1_depth]
-        else:
-            conv1_image = self.conv1_image(image)
-            conv1_depth = self.conv1_depth(depth)
-            conv1_fused = None
-
-            skips1 = [conv1_image, conv1_depth]
-
-        # Store as skip connection
-        layers.append(torch.cat(skips1, dim=1))
-
-        # Resolution: 1/2 -> 1/4
-        _, _, n_height1, n_width1 = conv1_image.shape
-
-        if 1 in self.resolutions_backprojection:
-            intrinsics1 = scale_intrinsics(
-                batch=n_batch,
-                height0=n_height0,
-                width0=n_width0,
-                height1=n_height1,
-                width1=n_width1,
-                k=intrinsics,
-            )
+        Arg(s):
+            image : torch.Tensor[float32]
+                N x C x H x W image
+            depth : torch.Tensor[float32]
+                N x 1 x H x W depth map
+            intrinsics : torch.Tensor[float32]
+                N x 3 x 3 calibration
+            freeze : bool
+                if set, then inline weights as constants and fold batch normalization
+                into convolutions, weights cannot be trained after
+        Returns:
+            torch.jit.ScriptModule : traced encoder
+        """
 
-            # Normalized camera coordinates
-            coordinates1 = camera_coordinates(n_batch, n_height1, n_width1, intrinsics1)
+        # Coordinates buffers are kept in Python dicts that tracing would bake in as
+        # constants shared across calls
+        assert (
+            not self.reuse_coordinates_buffers
+        ), "Disable reuse_coordinates_buffers before tracing encoder"
 
-            # Calibrated backprojection
-            conv2_image, conv2_depth, conv2_fused = self.calibrated_backprojection2(
-                image=conv1_image,
-                depth=conv1_depth,
-                coordinates=coordinates1,
-                fused=conv1_fused,
-            )
+        traced = torch.jit.trace(self, (image, depth, intrinsics), strict=False)
 
-            skips2 = [conv2_fused, conv2_depth]
-        else:
-            if conv1_fused is not None:
-                conv2_image = self.conv2_image(conv1_fused)
-            else:
-                conv2_image = self.conv2_image(conv1_image)
+        # Skip optimize_for_inference as its MKLDNN graphs on CPU cannot be saved
+        if freeze:
+            traced = torch.jit.freeze(traced)
 
-            conv2_depth = self.conv2_depth(conv1_depth)
-            conv2_fused = None
+        return traced
 
-            skips2 = [conv2_image, conv2_depth]
+    def camera_coordinates(self, batch, height, width, k_inverse):
+        """
+        Computes normalized camera coordinates K^-1 [x, y, 1] for each pixel
 
-        # Store as skip connection
-        layers.append(torch.cat(skips2, dim=1))
+        Arg(s):
+            batch : int
+                number of samples in batch
+            height : int
+                height of feature map
+            width : int
+                width of feature map
+            k_inverse : torch.Tensor[float32]
+                N x 3 x 3 inverse calibration already scaled to the resolution
+        Returns:
+            torch.Tensor[float32] : N x 3 x H x W camera coordinates
+        """
 
-        # Resolution: 1/4 -> 1/8
-        _, _, n_height2, n_width2 = conv2_image.shape
+        # Reshape pixel coordinates to 1 x 3 x (H x W), reused across batches and
+        # calls as they only depend on the shape. Intrinsics may differ per sample,
+        # so K^-1 [x, y, 1] is always recomputed
+        key = (height, width, k_inverse.device)
 
-        if 2 in self.resolutions_backprojection:
-            intrinsics2 = scale_intrinsics(
-                batch=n_batch,
-                height0=n_height0,
-                width0=n_width0,
-                height1=n_height2,
-                width1=n_width2,
-                k=intrinsics,
+        if key not in self.meshgrid_cache:
+            xy_h = net_utils.meshgrid(
+                n_batch=1,
+                n_height=height,
+                n_width=width,
+                device=k_inverse.device,
+                homogeneous=True,
             )
+            self.meshgrid_cache[key] = xy_h.view(1, 3, -1)
+
+        xy_h = self.meshgrid_cache[key]
+
+        # K^-1 [x, y, 1] z and reshape back to N x 3 x H x W, pixel coordinates
+        # need more precision than float16 has so keep this in float32
+        with net_utils.autocast(enabled=False):
+            # Coordinates are saved for backward by backprojection, so buffers can
+            # only be reused when gradients are not computed
+            use_buffer = self.reuse_coordinates_buffers and not torch.is_grad_enabled()
+
+            if use_buffer:
+                # Inference tensors cannot be written to outside inference mode
+                key_buffer = (
+                    batch,
+                    height,
+                    width,
+                    k_inverse.device,
+                    k_inverse.dtype,
+                    torch.is_inference_mode_enabled(),
+                )
 
-            # Normalized camera coordinates
-            coordinates2 = camera_coordinates(n_batch, n_height2, n_width2, intrinsics2)
-
-            # Calibrated backprojection
-            conv3_image, conv3_depth, conv3_fused = self.calibrated_backprojection3(
-                image=conv2_image,
-                depth=conv2_depth,
-                coordinates=coordinates2,
-                fused=conv2_fused,
-            )
+                if key_buffer not in self.coordinates_buffers:
+                    self.coordinates_buffers[key_buffer] = torch.empty(
+                        (batch, 3, height * width),
+                        device=k_inverse.device,
+                        dtype=k_inverse.dtype,
+                    )
 
-            skips3 = [conv3_fused, conv3_depth]
-        else:
-            if conv2_fused is not None:
-                conv3_image = self.conv3_image(conv2_fused)
+                coordinates = torch.matmul(
+                    k_inverse, xy_h, out=self.coordinates_buffers[key_buffer]
+                )
             else:
-                conv3_image = self.conv3_image(conv2_image)
+                coordinates = torch.matmul(k_inverse, xy_h)
+        coordinates = coordinates.view(batch, 3, height, width)
 
-            conv3_depth = self.conv3_depth(conv2_depth)
-            conv3_fused = None
+        return coordinates
 
-            skips3 = [conv3_image, conv3_depth]
-
-        # Store as skip connection
-        layers.append(torch.cat(skips3, dim=1))
+    def forward(self, image, depth, intrinsics):
+        """
+        Forward image, depth and calibration through encoder
 
-        # Resolution: 1/8 -> 1/16
-        _, _, n_height3, n_width3 = conv3_image.shape
+        Arg(s):
+            image : torch.Tensor[float32]
+                N x C x H x W image
+            depth : torch.Tensor[float32]
+                N x 1 x H x W depth map
+            intrinsics : torch.Tensor[float32]
+                N x C x 3 x 3 calibration
+        Returns:
+            torch.Tensor[float32] : N x K x h x w output tensor
+            tuple[torch.Tensor[float32]] : skip connections, or tuple of tuples of
+                tensors if concatenate_skips is not set
+        """
 
-        if 3 in self.resolutions_backprojection:
-            intrinsics3 = scale_intrinsics(
-                batch=n_batch,
-                height0=n_height0,
-                width0=n_width0,
-                height1=n_height3,
-                width1=n_width3,
-                k=intrinsics,
-            )
+        if self.use_channels_last:
+            image = image.contiguous(memory_format=torch.channels_last)
+            depth = depth.contiguous(memory_format=torch.channels_last)
 
-            # Normalized camera coordinates
-            coordinates3 = camera_coordinates(n_batch, n_height3, n_width3, intrinsics3)
+        with net_utils.autocast(enabled=self.use_mixed_precision):
+            n_batch, _, n_height0, n_width0 = image.shape
+            dtype = image.dtype
+
+            side_stream = None
+
+            # Invert intrinsics once, every resolution is derived from it
+            if len(self.resolutions_backprojection) > 0:
+                if self.use_side_stream and intrinsics.is_cuda:
+                    if intrinsics.device not in self.side_streams:
+                        self.side_streams[intrinsics.device] = torch.cuda.Stream(
+                            intrinsics.device
+                        )
+
+                    # Side stream must wait for intrinsics to be written
+                    side_stream = self.side_streams[intrinsics.device]
+                    side_stream.wait_stream(
+                        torch.cuda.current_stream(intrinsics.device)
+                    )
 
-            # Calibrated backprojection
-            conv4_image, conv4_depth, conv4_fused = self.calibrated_backprojection4(
-                image=conv3_image,
-                depth=conv3_depth,
-                coordinates=coordinates3,
-                fused=conv3_fused,
-            )
+                # A stream of None leaves the current stream unchanged
+                with torch.cuda.stream(side_stream):
+                    with net_utils.autocast(enabled=False):
+                        intrinsics_inverse = net_utils.invert_intrinsics(
+                            intrinsics.float()
+                        )
+
+            skips = []
+
+            if 0 in self.resolutions_backprojection:
+                # Feature extractors
+                if self.conv0 is not None:
+                    inputs = [image, depth]
+
+                    if self.n_channel_pad_stem > 0:
+                        n_height, n_width = image.shape[-2:]
+                        inputs.append(
+                            image.new_zeros(
+                                (n_batch, self.n_channel_pad_stem, n_height, n_width)
+                            )
+                        )
+
+                    conv0 = self.conv0(torch.cat(inputs, dim=1))
+                    image, depth = torch.split(conv0, self.n_filters_stem, dim=1)
+                else:
+                    image = self.conv0_image(image)
+                    depth = self.conv0_depth(depth)
 
-            skips4 = [conv4_fused, conv4_depth]
-        else:
-            if conv3_fused is not None:
-                conv4_image = self.conv4_image(conv3_fused)
-            else:
-                conv4_image = self.conv4_image(conv3_image)
+            # Stems are queued, so wait for the inverse before it is consumed
+            if side_stream is not None:
+                current_stream = torch.cuda.current_stream(intrinsics.device)
+                current_stream.wait_stream(side_stream)
 
-            conv4_depth = self.conv4_depth(conv3_depth)
-            conv4_fused = None
+                # Memory allocated on the side stream is now also used here
+                intrinsics_inverse.record_stream(current_stream)
 
-            skips4 = [conv4_image, conv4_depth]
+            fused = None
 
-        # Store as skip connection
-        layers.append(torch.cat(skips4, dim=1))
+            for n, stage in enumerate(self.stages):
+                if n in self.resolutions_backprojection:
+                    # Normalized camera coordinates
+                    _, _, n_height, n_width = image.shape
 
-        # Resolution: 1/16 -> 1/32
-        _, _, n_height4, n_width4 = conv4_image.shape
+                    coordinates = self.camera_coordinates(
+                        n_batch, n_height, n_width, intrinsics_inverse
+                    )
 
-        if 4 in self.resolutions_backprojection:
-            intrinsics4 = scale_intrinsics(
-                batch=n_batch,
-                height0=n_height0,
-                width0=n_width0,
-                height1=n_height4,
-                width1=n_width4,
-                k=intrinsics,
-            )
+                    # Coordinates are float32, so match features of an encoder
+                    # converted to lower precision. Autocast casts them itself
+                    if not torch.is_autocast_enabled():
+                        coordinates = coordinates.to(image.dtype)
+
+                    # Calibrated backprojection
+                    image, depth, fused = stage(
+                        image=image,
+                        depth=depth,
+                        coordinates=coordinates,
+                        fused=fused,
+                    )
 
-            # Normalized camera coordinates
-            coordinates4 = camera_coordinates(n_batch, n_height4, n_width4, intrinsics4)
+                    skip = (fused, depth)
+                else:
+                    conv_image, conv_depth = stage
 
-            # Calibrated backprojection
-            conv5_image, conv5_depth, conv5_fused = self.calibrated_backprojection4(
-                image=conv4_image,
-                depth=conv4_depth,
-                coordinates=coordinates4,
-                fused=conv4_fused,
-            )
+                    if fused is not None:
+                        image = conv_image(fused)
+                    else:
+                        image = conv_image(image)
 
-            skips5 = [conv5_fused, conv5_depth]
-        else:
-            if conv4_fused is not None:
-                conv5_image = self.conv5_image(conv4_fused)
-            else:
-                conv5_image = self.conv5_image(conv4_image)
+                    depth = conv_depth(depth)
+                    fused = None
 
-            conv5_depth = self.conv5_depth(conv4_depth)
-            conv5_fused = None
+                    skip = (image, depth)
 
-            skips5 = [conv5_image, conv5_depth]
+                # Intrinsics for resolutions after the first are scaled from 1/1 to
+                # 1/2, which is what the released models were trained with
+                if n == 0:
+                    _, _, n_height1, n_width1 = image.shape
+                    scale_x = n_width1 / n_width0
+                    scale_y = n_height1 / n_height0
+
+                    # Scaling K by (scale_x, scale_y) gives (S K)^-1 = K^-1 S^-1, so
+                    # scale the columns of K^-1 once for all later resolutions
+                    if len(self.resolutions_backprojection) > 0 and (
+                        scale_x != 1.0 or scale_y != 1.0
+                    ):
+                        intrinsics_inverse = torch.cat(
+                            [
+                                intrinsics_inverse[:, :, 0:1] / scale_x,
+                                intrinsics_inverse[:, :, 1:2] / scale_y,
+                                intrinsics_inverse[:, :, 2:3],
+                            ],
+                            dim=2,
+                        )
+
+                # Last output is the latent and always concatenated, the rest are
+                # stored as skip connections
+                if n == len(self.stages) - 1:
+                    latent = torch.cat(skip, dim=1)
+                elif self.concatenate_skips:
+                    skips.append(torch.cat(skip, dim=1))
+                else:
+                    skips.append(skip)
 
-        # Store as skip connection
-        layers.append(torch.cat(skips5, dim=1))
+        # Return features in the precision of the inputs
+        if self.use_mixed_precision:
+            latent = latent.to(dtype)
+            if self.concatenate_skips:
+                skips = [skip.to(dtype) for skip in skips]
+            else:
+                skips = [tuple(s.to(dtype) for s in skip) for skip in skips]
 
-        return layers[-1], layers[0:-1]
+        # Tracing only supports tuples of tuples
+        return latent, tuple(skips)
 
 
 class PoseEncoder(torch.nn.Module):
@@ -580,6 +658,10 @@ class PoseEncoder(torch.nn.Module):
             if set, then apply batch normalization
         use_instance_norm : bool
             if set, then apply instance normalization
+        use_mixed_precision : bool
+            if set, then run convolutions in float16 with automatic mixed precision
+        use_channels_last : bool
+            if set, then run convolutions in channels last (N x H x W x C) memory format
     """
 
     def __init__(
@@ -590,87 +672,80 @@ class PoseEncoder(torch.nn.Module):
         activation_func="leaky_relu",
         use_batch_norm=False,
         use_instance_norm=False,
+        use_mixed_precision=False,
+        use_channels_last=False,
     ):
         super(PoseEncoder, self).__init__()
 
+        self.use_mixed_precision = use_mixed_precision
+        self.use_channels_last = use_channels_last
+
         activation_func = net_utils.activation_func(activation_func)
 
-        self.conv1 = net_utils.Conv2d(
-            input_channels,
-            n_filters[0],
-            kernel_size=7,
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+        # Each convolution halves resolution, so all are chained in one container
+        kernel_sizes = [7, 5, 3, 3, 3, 3, 3]
+        in_channels = input_channels
 
-        self.conv2 = net_utils.Conv2d(
-            n_filters[0],
-            n_filters[1],
-            kernel_size=5,
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+        convs = []
+        for kernel_size, out_channels in zip(kernel_sizes, n_filters):
+            conv = net_utils.Conv2d(
+                in_channels,
+                out_channels,
+                kernel_size=kernel_size,
+                stride=2,
+                weight_initializer=weight_initializer,
+                activation_func=activation_func,
+                use_batch_norm=use_batch_norm,
+                use_instance_norm=use_instance_norm,
+            )
+            convs.append(conv)
 
-        self.conv3 = net_utils.Conv2d(
-            n_filters[1],
-            n_filters[2],
-            kernel_size=3,
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+            in_channels = out_channels
 
-        self.conv4 = net_utils.Conv2d(
-            n_filters[2],
-            n_filters[3],
-            kernel_size=3,
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+        self.convs = torch.nn.Sequential(*convs)
 
-        self.conv5 = net_utils.Conv2d(
-            n_filters[3],
-            n_filters[4],
-            kernel_size=3,
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+        self._register_load_state_dict_pre_hook(self.rename_convs_state_dict)
 
-        self.conv6 = net_utils.Conv2d(
-            n_filters[4],
-            n_filters[5],
-            kernel_size=3,
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+        if use_channels_last:
+            self.to(memory_format=torch.channels_last)
 
-        self.conv7 = net_utils.Conv2d(
-            n_filters[5],
-            n_filters[6],
-            kernel_size=3,
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+    def rename_convs_state_dict(
+        self,
+        state_dict,
+        prefix,
+        local_metadata,
+        strict,
+        missing_keys,
+        unexpected_keys,
+        error_msgs,
+    ):
+        """
+        Renames conv{1-7} keys of state dicts saved before convolutions were held in a
+        single container to convs.{0-6}
+
+        Arg(s):
+            state_dict : dict
+                state dict being loaded
+            prefix : str
+                prefix of this module in state dict
+            local_metadata : dict
+                metadata of this module
+            strict : bool
+                whether keys must match exactly
+            missing_keys : list[str]
+                keys missing from state dict
+            unexpected_keys : list[str]
+                unexpected keys in state dict
+            error_msgs : list[str]
+                error messages
+        """
+
+        renames = [
+            ("conv{}.".format(n + 1), "convs.{}.".format(n))
+            for n in range(len(self.convs))
+        ]
+
+        net_utils.rename_state_dict_keys(state_dict, prefix, renames)
 
     def forward(self, x):
         """
@@ -684,30 +759,35 @@ class PoseEncoder(torch.nn.Module):
             None
         """
 
-        layers = [x]
-
-        # Resolution 1/1 -> 1/2
-        layers.append(self.conv1(layers[-1]))
-
-        # Resolution 1/2 -> 1/4
-        layers.append(self.conv2(layers[-1]))
+        if self.use_channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
 
-        # Resolution 1/4 -> 1/8
-        layers.append(self.conv3(layers[-1]))
+        # TorchScript does not support automatic mixed precision contexts
+        if self.use_mixed_precision and not torch.jit.is_scripting():
+            with net_utils.autocast(enabled=True):
+                latent = self.encode(x)
 
-        # Resolution 1/8 -> 1/16
-        layers.append(self.conv4(layers[-1]))
+            # Return features in the precision of the inputs
+            latent = latent.to(x.dtype)
+        else:
+            latent = self.encode(x)
 
-        # Resolution 1/16 -> 1/32
-        layers.append(self.conv5(layers[-1]))
+        return latent, None
 
-        # Resolution 1/32 -> 1/64
-        layers.append(self.conv6(layers[-1]))
+    def encode(self, x):
+        """
+        Forward input x through convolutions of encoder
 
-        # Resolution 1/64 -> 1/128
-        layers.append(self.conv7(layers[-1]))
+        Arg(s):
+            x : torch.Tensor[float32]
+                input image N x C x H x W
+        Returns:
+            torch.Tensor[float32] : N x K x h x w output tensor
+        """
 
-        return layers[-1], None
+        # Only the latent is returned, so intermediate features are not kept and
+        # resolution 1/1 -> 1/128 runs as a single call
+        return self.convs(x)
 
 
 class ResNetEncoder(torch.nn.Module):
@@ -731,6 +811,16 @@ class ResNetEncoder(torch.nn.Module):
             if set, then apply instance normalization
         use_depthwise_separable : bool
             if set, then use depthwise separable convolutions instead of convolutions
+        use_channels_last : bool
+            if set, then run convolutions in channels last (N x H x W x C) memory format
+        use_mixed_precision : bool
+            if set, then run convolutions in bfloat16 with automatic mixed precision
+        use_gradient_checkpointing : bool
+            if set, then recompute activations of stages at 1/8 resolution and lower
+            in backward instead of storing them, only applies to training
+        use_fast_stem : bool
+            if set, then replace 7 x 7 convolution and max pool of the stem with two
+            3 x 3 strided convolutions, which cannot load weights of the default stem
     """
 
     def __init__(
@@ -743,9 +833,17 @@ class ResNetEncoder(torch.nn.Module):
         use_batch_norm=False,
         use_instance_norm=False,
         use_depthwise_separable=False,
+        use_channels_last=False,
+        use_mixed_precision=False,
+        use_gradient_checkpointing=False,
+        use_fast_stem=False,
     ):
         super(ResNetEncoder, self).__init__()
 
+        self.use_channels_last = use_channels_last
+        self.use_mixed_precision = use_mixed_precision
+        self.use_gradient_checkpointing = use_gradient_checkpointing
+
         use_bottleneck = False
         if n_layer == 18:
             n_blocks = [2, 2, 2, 2]
@@ -755,267 +853,173 @@ class ResNetEncoder(torch.nn.Module):
             resnet_block = net_utils.ResNetBlock
         elif n_layer == 50:
             n_blocks = [3, 4, 6, 3]
-            use_bottleneck = True
-            resnet_block = net_utils.ResNetBottleneckBlock
-        else:
-            raise ValueError("Only supports 18, 34, 50 layer architecture")
-
-        for n in range(len(n_filters) - len(n_blocks) - 1):
-            n_blocks = n_blocks + [n_blocks[-1]]
-
-        assert len(n_filters) == len(n_blocks) + 1
-
-        # Keep track on current block
-        block_idx = 0
-        filter_idx = 0
-
-        activation_func = net_utils.activation_func(activation_func)
-
-        in_channels, out_channels = [input_channels, n_filters[filter_idx]]
-
-        # Resolution 1/1 -> 1/2
-        self.conv1 = net_utils.Conv2d(
-            in_channels,
-            out_channels,
-            kernel_size=7,
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
-
-        # Resolution 1/2 -> 1/4
-        self.max_pool = torch.nn.MaxPool2d(kernel_size=3, stride=2, padding=1)
-
-        filter_idx = filter_idx + 1
-
-        blocks2 = []
-        in_channels, out_channels = [n_filters[filter_idx - 1], n_filters[filter_idx]]
-        for n in range(n_blocks[block_idx]):
-            if n == 0:
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=1,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                    use_depthwise_separable=False,
-                )
-            else:
-                in_channels = 4 * out_channels if use_bottleneck else out_channels
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=1,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                    use_depthwise_separable=False,
-                )
-
-            blocks2.append(block)
-
-        self.blocks2 = torch.nn.Sequential(*blocks2)
-
-        # Resolution 1/4 -> 1/8
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
-
-        blocks3 = []
-        in_channels, out_channels = [n_filters[filter_idx - 1], n_filters[filter_idx]]
-        for n in range(n_blocks[block_idx]):
-            if n == 0:
-                in_channels = 4 * in_channels if use_bottleneck else in_channels
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=2,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                    use_depthwise_separable=False,
-                )
-            else:
-                in_channels = 4 * out_channels if use_bottleneck else out_channels
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=1,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                    use_depthwise_separable=False,
-                )
+            use_bottleneck = True
+            resnet_block = net_utils.ResNetBottleneckBlock
+        else:
+            raise ValueError("Only supports 18, 34, 50 layer architecture")
 
-            blocks3.append(block)
+        for n in range(len(n_filters) - len(n_blocks) - 1):
+            n_blocks = n_blocks + [n_blocks[-1]]
 
-        self.blocks3 = torch.nn.Sequential(*blocks3)
+        assert len(n_filters) == len(n_blocks) + 1
 
-        # Resolution 1/8 -> 1/16
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
+        activation_func = net_utils.activation_func(activation_func)
 
-        blocks4 = []
-        in_channels, out_channels = [n_filters[filter_idx - 1], n_filters[filter_idx]]
-        for n in range(n_blocks[block_idx]):
-            if n == 0:
-                in_channels = 4 * in_channels if use_bottleneck else in_channels
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=2,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                    use_depthwise_separable=use_depthwise_separable,
-                )
-            else:
-                in_channels = 4 * out_channels if use_bottleneck else out_channels
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=1,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                    use_depthwise_separable=use_depthwise_separable,
-                )
+        # Resolution 1/1 -> 1/2
+        self.conv1 = net_utils.Conv2d(
+            input_channels,
+            n_filters[0],
+            kernel_size=3 if use_fast_stem else 7,
+            stride=2,
+            weight_initializer=weight_initializer,
+            activation_func=activation_func,
+            use_batch_norm=use_batch_norm,
+            use_instance_norm=use_instance_norm,
+        )
 
-            blocks4.append(block)
+        # Resolution 1/2 -> 1/4, output of conv1 is still the 1/2 skip connection
+        if use_fast_stem:
+            self.pool = net_utils.Conv2d(
+                n_filters[0],
+                n_filters[0],
+                kernel_size=3,
+                stride=2,
+                weight_initializer=weight_initializer,
+                activation_func=activation_func,
+                use_batch_norm=use_batch_norm,
+                use_instance_norm=use_instance_norm,
+            )
+        else:
+            self.pool = torch.nn.MaxPool2d(kernel_size=3, stride=2, padding=1)
+
+        # Bottleneck blocks output 4 x out_channels
+        expansion = 4 if use_bottleneck else 1
+
+        # Stage configurations, each after the first halves resolution down to at
+        # most 1/128 and the first two do not use depthwise separable convolutions.
+        # First stage follows max pool, so its input channels are not expanded
+        stage_configs = []
+
+        for n in range(1, min(len(n_filters), 7)):
+            stage_configs.append(
+                {
+                    "in_channels": n_filters[n - 1] * (1 if n == 1 else expansion),
+                    "block_in_channels": expansion * n_filters[n],
+                    "out_channels": n_filters[n],
+                    "stride": 1 if n == 1 else 2,
+                    "n_block": n_blocks[n - 1],
+                    "use_depthwise_separable": use_depthwise_separable and n > 2,
+                }
+            )
 
-        self.blocks4 = torch.nn.Sequential(*blocks4)
+        self.stages = torch.nn.ModuleList()
 
-        # Resolution 1/16 -> 1/32
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
+        for stage_config in stage_configs:
+            blocks = []
+            for k in range(stage_config["n_block"]):
+                # Blocks after the first take the output of the previous block
+                if k == 0:
+                    in_channels = stage_config["in_channels"]
+                else:
+                    in_channels = stage_config["block_in_channels"]
 
-        blocks5 = []
-        in_channels, out_channels = [n_filters[filter_idx - 1], n_filters[filter_idx]]
-        for n in range(n_blocks[block_idx]):
-            if n == 0:
-                in_channels = 4 * in_channels if use_bottleneck else in_channels
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=2,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                    use_depthwise_separable=use_depthwise_separable,
-                )
-            else:
-                in_channels = 4 * out_channels if use_bottleneck else out_channels
                 block = resnet_block(
                     in_channels,
-                    out_channels,
-                    stride=1,
+                    stage_config["out_channels"],
+                    stride=stage_config["stride"] if k == 0 else 1,
                     weight_initializer=weight_initializer,
                     activation_func=activation_func,
                     use_batch_norm=use_batch_norm,
                     use_instance_norm=use_instance_norm,
-                    use_depthwise_separable=use_depthwise_separable,
+                    use_depthwise_separable=stage_config["use_depthwise_separable"],
                 )
 
-            blocks5.append(block)
+                blocks.append(block)
 
-        self.blocks5 = torch.nn.Sequential(*blocks5)
+            self.stages.append(torch.nn.Sequential(*blocks))
 
-        # Resolution 1/32 -> 1/64
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
+        self._register_load_state_dict_pre_hook(self.rename_stages_state_dict)
 
-        if filter_idx < len(n_filters):
-            blocks6 = []
-            in_channels, out_channels = [
-                n_filters[filter_idx - 1],
-                n_filters[filter_idx],
-            ]
-            for n in range(n_blocks[block_idx]):
-                if n == 0:
-                    in_channels = 4 * in_channels if use_bottleneck else in_channels
-                    block = resnet_block(
-                        in_channels,
-                        out_channels,
-                        stride=2,
-                        weight_initializer=weight_initializer,
-                        activation_func=activation_func,
-                        use_batch_norm=use_batch_norm,
-                        use_instance_norm=use_instance_norm,
-                        use_depthwise_separable=use_depthwise_separable,
-                    )
-                else:
-                    in_channels = 4 * out_channels if use_bottleneck else out_channels
-                    block = resnet_block(
-                        in_channels,
-                        out_channels,
-                        stride=1,
-                        weight_initializer=weight_initializer,
-                        activation_func=activation_func,
-                        use_batch_norm=use_batch_norm,
-                        use_instance_norm=use_instance_norm,
-                        use_depthwise_separable=use_depthwise_separable,
-                    )
+        if use_channels_last:
+            self.to(memory_format=torch.channels_last)
+        elif use_depthwise_separable:
+            # Depthwise stages run channels last even if the rest of the encoder is NCHW
+            net_utils.depthwise_separable_channels_last(self)
 
-                blocks6.append(block)
+    def rename_stages_state_dict(
+        self,
+        state_dict,
+        prefix,
+        local_metadata,
+        strict,
+        missing_keys,
+        unexpected_keys,
+        error_msgs,
+    ):
+        """
+        Renames blocks{2-7} keys of state dicts saved before stages were held in a list
+        to stages.{0-5}
 
-            self.blocks6 = torch.nn.Sequential(*blocks6)
-        else:
-            self.blocks6 = None
+        Arg(s):
+            state_dict : dict
+                state dict being loaded
+            prefix : str
+                prefix of this module in state dict
+            local_metadata : dict
+                metadata of this module
+            strict : bool
+                whether keys must match exactly
+            missing_keys : list[str]
+                keys missing from state dict
+            unexpected_keys : list[str]
+                unexpected keys in state dict
+            error_msgs : list[str]
+                error messages
+        """
 
-        # Resolution 1/64 -> 1/128
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
+        renames = [
+            ("blocks{}.".format(n + 2), "stages.{}.".format(n))
+            for n in range(len(self.stages))
+        ]
 
-        if filter_idx < len(n_filters):
-            blocks7 = []
-            in_channels, out_channels = [
-                n_filters[filter_idx - 1],
-                n_filters[filter_idx],
-            ]
-            for n in range(n_blocks[block_idx]):
-                if n == 0:
-                    in_channels = 4 * in_channels if use_bottleneck else in_channels
-                    block = resnet_block(
-                        in_channels,
-                        out_channels,
-                        stride=2,
-                        weight_initializer=weight_initializer,
-                        activation_func=activation_func,
-                        use_batch_norm=use_batch_norm,
-                        use_instance_norm=use_instance_norm,
-                        use_depthwise_separable=use_depthwise_separable,
-                    )
-                else:
-                    in_channels = 4 * out_channels if use_bottleneck else out_channels
-                    block = resnet_block(
-                        in_channels,
-                        out_channels,
-                        stride=1,
-                        weight_initializer=weight_initializer,
-                        activation_func=activation_func,
-                        use_batch_norm=use_batch_norm,
-                        use_instance_norm=use_instance_norm,
-                        use_depthwise_separable=use_depthwise_separable,
-                    )
+        net_utils.rename_state_dict_keys(state_dict, prefix, renames)
+
+    def forward(self, x):
+        """
+        Forward input x through a ResNet encoder
+
+        Arg(s):
+            x : torch.Tensor[float32]
+                N x C x H x W input tensor
+        Returns:
+            torch.Tensor[float32] : N x K x h x w output tensor
+            tuple[torch.Tensor[float32]] : skip connections, list if scripted
+        """
 
-                blocks7.append(block)
+        if self.use_channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
 
-            self.blocks7 = torch.nn.Sequential(*blocks7)
+        # TorchScript does not support automatic mixed precision contexts
+        if self.use_mixed_precision and not torch.jit.is_scripting():
+            # bfloat16 has the range of float32, so gradients need no loss scaling
+            with net_utils.autocast(enabled=True, dtype=torch.bfloat16):
+                latent, skips = self.encode(x)
+
+            # Return features in the precision of the inputs
+            latent = latent.to(x.dtype)
+            skips = [skip.to(x.dtype) for skip in skips]
         else:
-            self.blocks7 = None
+            latent, skips = self.encode(x)
 
-    def forward(self, x):
+        # TorchScript only supports tuples of fixed length, so return a list there
+        if torch.jit.is_scripting():
+            return latent, skips
+
+        return latent, tuple(skips)
+
+    def encode(self, x):
         """
-        Forward input x through a ResNet encoder
+        Forward input x through convolutions of encoder
 
         Arg(s):
             x : torch.Tensor[float32]
@@ -1025,33 +1029,58 @@ class ResNetEncoder(torch.nn.Module):
             list[torch.Tensor[float32]] : list of skip connections
         """
 
-        layers = [x]
+        # Skips are collected here rather than by forward hooks on stages, which
+        # would write to state shared by DataParallel replicas, are not run for
+        # stages recomputed by checkpointing and cannot be scripted
 
         # Resolution 1/1 -> 1/2
-        layers.append(self.conv1(layers[-1]))
+        x = self.conv1(x)
+        skips = [x]
 
-        # Resolution 1/2 -> 1/4
-        max_pool = self.max_pool(layers[-1])
-        layers.append(self.blocks2(max_pool))
+        # Resolution 1/2 -> 1/4, then each stage after the first halves resolution
+        x = self.pool(x)
 
-        # Resolution 1/4 -> 1/8
-        layers.append(self.blocks3(layers[-1]))
+        use_gradient_checkpointing = (
+            self.use_gradient_checkpointing
+            and self.training
+            and torch.is_grad_enabled()
+            and not torch.jit.is_scripting()
+        )
 
-        # Resolution 1/8 -> 1/16
-        layers.append(self.blocks4(layers[-1]))
+        for n, stage in enumerate(self.stages):
+            # Inputs of stages after the first are skip connections
+            if n > 0:
+                skips.append(x)
+
+            # Deeper stages have many blocks on small feature maps, so recomputing
+            # them costs little compared to the memory of their activations
+            if use_gradient_checkpointing and n >= 2:
+                x = self.checkpoint_stage(n, x)
+            else:
+                x = stage(x)
+
+        return x, skips
 
-        # Resolution 1/16 -> 1/32
-        layers.append(self.blocks5(layers[-1]))
+    @torch.jit.unused
+    def checkpoint_stage(self, n: int, x):
+        """
+        Forward input x through a stage without storing its activations, which are
+        recomputed in backward
 
-        # Resolution 1/32 -> 1/64
-        if self.blocks6 is not None:
-            layers.append(self.blocks6(layers[-1]))
+        Arg(s):
+            n : int
+                index of stage
+            x : torch.Tensor[float32]
+                N x C x H x W input tensor
+        Returns:
+            torch.Tensor[float32] : N x K x h x w output tensor
+        """
 
-        # Resolution 1/64 -> 1/128
-        if self.blocks7 is not None:
-            layers.append(self.blocks7(layers[-1]))
+        stage = self.stages[n]
 
-        return layers[-1], layers[1:-1]
+        return torch.utils.checkpoint.checkpoint_sequential(
+            stage, min(2, len(stage)), x, use_reentrant=False
+        )
 
 
 class AtrousResNetEncoder(torch.nn.Module):
@@ -1075,6 +1104,13 @@ class AtrousResNetEncoder(torch.nn.Module):
             if set, then apply batch normalization
         use_instance_norm : bool
             if set, then apply instance normalization
+        use_channels_last : bool
+            if set, then run convolutions in channels last (N x H x W x C) memory format
+        use_mixed_precision : bool
+            if set, then run convolutions in bfloat16 with automatic mixed precision
+        use_shared_atrous_spatial_pyramid_pool : bool
+            if set, then replace the dilated stages at 1/8 resolution with a single
+            depthwise separable ASPP, whose output is also the 1/8 skip connection
     """
 
     def __init__(
@@ -1087,9 +1123,18 @@ class AtrousResNetEncoder(torch.nn.Module):
         activation_func="leaky_relu",
         use_batch_norm=False,
         use_instance_norm=False,
+        use_channels_last=False,
+        use_mixed_precision=False,
+        use_shared_atrous_spatial_pyramid_pool=False,
     ):
         super(AtrousResNetEncoder, self).__init__()
 
+        self.use_channels_last = use_channels_last
+        self.use_mixed_precision = use_mixed_precision
+        self.use_shared_atrous_spatial_pyramid_pool = (
+            use_shared_atrous_spatial_pyramid_pool
+        )
+
         if n_layer == 18:
             n_blocks = [2, 2, 2, 2]
             resnet_block = net_utils.ResNetBlock
@@ -1103,6 +1148,10 @@ class AtrousResNetEncoder(torch.nn.Module):
 
         assert len(n_filters) == len(n_blocks) + 1
 
+        assert (
+            not use_shared_atrous_spatial_pyramid_pool or n_filters[3] == n_filters[4]
+        ), "Shared ASPP output is used as skip connection, so n_filters[3] must equal n_filters[4]"
+
         activation_func = net_utils.activation_func(activation_func)
         dilation = 2
         in_channels, out_channels = [input_channels, n_filters[0]]
@@ -1179,78 +1228,99 @@ class AtrousResNetEncoder(torch.nn.Module):
                 blocks3.append(block)
         self.blocks3 = torch.nn.Sequential(*blocks3)
 
-        # Resolution 1/8 with 2x dilation
-        blocks4 = []
-        in_channels, out_channels = [n_filters[2], n_filters[3]]
-        for n in range(n_blocks[2]):
-            if n == 0:
-                block = atrous_resnet_block(
-                    in_channels,
-                    out_channels,
-                    dilation=dilation,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                )
-                dilation = dilation * 2
-                blocks4.append(block)
-            else:
-                in_channels = out_channels
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=1,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                )
-                blocks4.append(block)
-        self.blocks4 = torch.nn.Sequential(*blocks4)
-
-        # Resolution 1/8 with 4x dilation
-        blocks5 = []
-        in_channels, out_channels = [n_filters[3], n_filters[4]]
-        for n in range(n_blocks[3]):
-            if n == 0:
-                block = atrous_resnet_block(
-                    in_channels,
-                    out_channels,
-                    dilation=dilation,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                )
-                dilation = dilation * 2
-                blocks5.append(block)
-            else:
-                in_channels = out_channels
-                block = resnet_block(
-                    in_channels,
-                    out_channels,
-                    stride=1,
-                    weight_initializer=weight_initializer,
-                    activation_func=activation_func,
-                    use_batch_norm=use_batch_norm,
-                    use_instance_norm=use_instance_norm,
-                )
-                blocks5.append(block)
-        self.blocks5 = torch.nn.Sequential(*blocks5)
+        if use_shared_atrous_spatial_pyramid_pool:
+            # Resolution 1/8 with every dilation rate in one pyramid pool
+            if atrous_spatial_pyramid_pool_dilations is None:
+                atrous_spatial_pyramid_pool_dilations = [2, 4, 8]
 
-        if atrous_spatial_pyramid_pool_dilations is not None:
             self.atrous_spatial_pyramid_pool = net_utils.AtrousSpatialPyramidPooling(
-                in_channels,
-                out_channels,
+                n_filters[2],
+                n_filters[4],
                 dilations=atrous_spatial_pyramid_pool_dilations,
                 weight_initializer=weight_initializer,
                 activation_func=activation_func,
                 use_batch_norm=use_batch_norm,
                 use_instance_norm=use_instance_norm,
+                use_depthwise_separable=True,
             )
         else:
-            self.atrous_spatial_pyramid_pool = torch.nn.Identity()
+            # Resolution 1/8 with 2x dilation
+            blocks4 = []
+            in_channels, out_channels = [n_filters[2], n_filters[3]]
+            for n in range(n_blocks[2]):
+                if n == 0:
+                    block = atrous_resnet_block(
+                        in_channels,
+                        out_channels,
+                        dilation=dilation,
+                        weight_initializer=weight_initializer,
+                        activation_func=activation_func,
+                        use_batch_norm=use_batch_norm,
+                        use_instance_norm=use_instance_norm,
+                    )
+                    dilation = dilation * 2
+                    blocks4.append(block)
+                else:
+                    in_channels = out_channels
+                    block = resnet_block(
+                        in_channels,
+                        out_channels,
+                        stride=1,
+                        weight_initializer=weight_initializer,
+                        activation_func=activation_func,
+                        use_batch_norm=use_batch_norm,
+                        use_instance_norm=use_instance_norm,
+                    )
+                    blocks4.append(block)
+            self.blocks4 = torch.nn.Sequential(*blocks4)
+
+            # Resolution 1/8 with 4x dilation
+            blocks5 = []
+            in_channels, out_channels = [n_filters[3], n_filters[4]]
+            for n in range(n_blocks[3]):
+                if n == 0:
+                    block = atrous_resnet_block(
+                        in_channels,
+                        out_channels,
+                        dilation=dilation,
+                        weight_initializer=weight_initializer,
+                        activation_func=activation_func,
+                        use_batch_norm=use_batch_norm,
+                        use_instance_norm=use_instance_norm,
+                    )
+                    dilation = dilation * 2
+                    blocks5.append(block)
+                else:
+                    in_channels = out_channels
+                    block = resnet_block(
+                        in_channels,
+                        out_channels,
+                        stride=1,
+                        weight_initializer=weight_initializer,
+                        activation_func=activation_func,
+                        use_batch_norm=use_batch_norm,
+                        use_instance_norm=use_instance_norm,
+                    )
+                    blocks5.append(block)
+            self.blocks5 = torch.nn.Sequential(*blocks5)
+
+            if atrous_spatial_pyramid_pool_dilations is not None:
+                self.atrous_spatial_pyramid_pool = (
+                    net_utils.AtrousSpatialPyramidPooling(
+                        in_channels,
+                        out_channels,
+                        dilations=atrous_spatial_pyramid_pool_dilations,
+                        weight_initializer=weight_initializer,
+                        activation_func=activation_func,
+                        use_batch_norm=use_batch_norm,
+                        use_instance_norm=use_instance_norm,
+                    )
+                )
+            else:
+                self.atrous_spatial_pyramid_pool = torch.nn.Identity()
+
+        if use_channels_last:
+            self.to(memory_format=torch.channels_last)
 
     def forward(self, x):
         """
@@ -1261,30 +1331,62 @@ class AtrousResNetEncoder(torch.nn.Module):
                 N x C x H x W input tensor
         Returns:
             torch.Tensor[float32] : N x K x h x w output tensor
-            list[torch.Tensor[float32]] : list of skip connections
+            tuple[torch.Tensor[float32]] : skip connections
+        """
+
+        if self.use_channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+
+        # TorchScript does not support automatic mixed precision contexts
+        if self.use_mixed_precision and not torch.jit.is_scripting():
+            # bfloat16 has the range of float32, so gradients need no loss scaling
+            with net_utils.autocast(enabled=True, dtype=torch.bfloat16):
+                latent, skips = self.encode(x)
+
+            # Return features in the precision of the inputs
+            latent = latent.to(x.dtype)
+            skips = tuple(skip.to(x.dtype) for skip in skips)
+        else:
+            latent, skips = self.encode(x)
+
+        return latent, skips
+
+    def encode(self, x):
+        """
+        Forward input x through convolutions of encoder
+
+        Arg(s):
+            x : torch.Tensor[float32]
+                N x C x H x W input tensor
+        Returns:
+            torch.Tensor[float32] : N x K x h x w output tensor
+            tuple[torch.Tensor[float32]] : skip connections
         """
 
-        layers = [x]
-
         # Resolution 1/1 -> 1/2
-        layers.append(self.conv1(layers[-1]))
+        x1 = self.conv1(x)
 
         # Resolution 1/2 -> 1/4
-        max_pool = self.max_pool(layers[-1])
-        layers.append(self.blocks2(max_pool))
+        x2 = self.blocks2(self.max_pool(x1))
 
         # Resolution 1/4 -> 1/8
-        layers.append(self.blocks3(layers[-1]))
+        x3 = self.blocks3(x2)
+
+        if self.use_shared_atrous_spatial_pyramid_pool:
+            # Resolution 1/8 with all dilations applied in parallel
+            x5 = self.atrous_spatial_pyramid_pool(x3)
+
+            # Decoder expects a skip connection at 1/8 resolution after dilations
+            return x5, (x1, x2, x3, x5)
 
         # Resolution 1/8 with 2x dilation
-        layers.append(self.blocks4(layers[-1]))
+        x4 = self.blocks4(x3)
 
         # Resolution 1/8 with 4x dilation
         # ASPP only used if dilations are given, otherwise pass through (identity)
-        block5 = self.blocks5(layers[-1])
-        layers.append(self.atrous_spatial_pyramid_pool(block5))
+        x5 = self.atrous_spatial_pyramid_pool(self.blocks5(x4))
 
-        return layers[-1], layers[1:-1]
+        return x5, (x1, x2, x3, x4)
 
 
 class VGGNetEncoder(torch.nn.Module):
@@ -1308,6 +1410,10 @@ class VGGNetEncoder(torch.nn.Module):
             if set, then apply instance normalization
         use_depthwise_separable : bool
             if set, then use depthwise separable convolutions instead of convolutions
+        use_channels_last : bool
+            if set, then run convolutions in channels last (N x H x W x C) memory format
+        use_mixed_precision : bool
+            if set, then run convolutions in bfloat16 with automatic mixed precision
     """
 
     def __init__(
@@ -1320,9 +1426,14 @@ class VGGNetEncoder(torch.nn.Module):
         use_batch_norm=False,
         use_instance_norm=False,
         use_depthwise_separable=False,
+        use_channels_last=False,
+        use_mixed_precision=False,
     ):
         super(VGGNetEncoder, self).__init__()
 
+        self.use_channels_last = use_channels_last
+        self.use_mixed_precision = use_mixed_precision
+
         if n_layer == 8:
             n_convolutions = [1, 1, 1, 1, 1]
         elif n_layer == 11:
@@ -1376,121 +1487,70 @@ class VGGNetEncoder(torch.nn.Module):
         else:
             self.conv1 = conv1
 
-        # Resolution 1/2 -> 1/4
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
-        in_channels, out_channels = [n_filters[filter_idx - 1], n_filters[filter_idx]]
-
-        self.conv2 = net_utils.VGGNetBlock(
-            in_channels,
-            out_channels,
-            n_convolution=n_convolutions[block_idx],
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-            use_depthwise_separable=False,
-        )
-
-        # Resolution 1/4 -> 1/8
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
-        in_channels, out_channels = [n_filters[filter_idx - 1], n_filters[filter_idx]]
-
-        self.conv3 = net_utils.VGGNetBlock(
-            in_channels,
-            out_channels,
-            n_convolution=n_convolutions[block_idx],
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-            use_depthwise_separable=False,
-        )
-
-        # Resolution 1/8 -> 1/16
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
-        in_channels, out_channels = [n_filters[filter_idx - 1], n_filters[filter_idx]]
-
-        self.conv4 = net_utils.VGGNetBlock(
-            in_channels,
-            out_channels,
-            n_convolution=n_convolutions[block_idx],
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-            use_depthwise_separable=use_depthwise_separable,
-        )
-
-        # Resolution 1/16 -> 1/32
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
-        in_channels, out_channels = [n_filters[filter_idx - 1], n_filters[filter_idx]]
-
-        self.conv5 = net_utils.VGGNetBlock(
-            in_channels,
-            out_channels,
-            n_convolution=n_convolutions[block_idx],
-            stride=2,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-            use_depthwise_separable=use_depthwise_separable,
-        )
-
-        # Resolution 1/32 -> 1/64
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
-
-        if filter_idx < len(n_filters):
-            in_channels, out_channels = [
-                n_filters[filter_idx - 1],
-                n_filters[filter_idx],
-            ]
+        # Resolution 1/2 -> 1/4, then each stage halves resolution down to at most
+        # 1/128 and the first two do not use depthwise separable convolutions
+        self.stages = torch.nn.ModuleList()
 
-            self.conv6 = net_utils.VGGNetBlock(
-                in_channels,
-                out_channels,
-                n_convolution=n_convolutions[block_idx],
+        for n in range(1, min(len(n_filters), 7)):
+            stage = net_utils.VGGNetBlock(
+                n_filters[n - 1],
+                n_filters[n],
+                n_convolution=n_convolutions[n],
                 stride=2,
                 weight_initializer=weight_initializer,
                 activation_func=activation_func,
                 use_batch_norm=use_batch_norm,
                 use_instance_norm=use_instance_norm,
-                use_depthwise_separable=use_depthwise_separable,
+                use_depthwise_separable=use_depthwise_separable and n > 2,
             )
-        else:
-            self.conv6 = None
 
-        # Resolution 1/64 -> 1/128
-        block_idx = block_idx + 1
-        filter_idx = filter_idx + 1
+            self.stages.append(stage)
 
-        if filter_idx < len(n_filters):
-            in_channels, out_channels = [
-                n_filters[filter_idx - 1],
-                n_filters[filter_idx],
-            ]
+        self._register_load_state_dict_pre_hook(self.rename_stages_state_dict)
 
-            self.conv7 = net_utils.VGGNetBlock(
-                in_channels,
-                out_channels,
-                n_convolution=n_convolutions[block_idx],
-                stride=2,
-                weight_initializer=weight_initializer,
-                activation_func=activation_func,
-                use_batch_norm=use_batch_norm,
-                use_instance_norm=use_instance_norm,
-                use_depthwise_separable=use_depthwise_separable,
-            )
-        else:
-            self.conv7 = None
+        if use_channels_last:
+            self.to(memory_format=torch.channels_last)
+        elif use_depthwise_separable:
+            # Depthwise stages run channels last even if the rest of the encoder is NCHW
+            net_utils.depthwise_separable_channels_last(self)
+
+    def rename_stages_state_dict(
+        self,
+        state_dict,
+        prefix,
+        local_metadata,
+        strict,
+        missing_keys,
+        unexpected_keys,
+        error_msgs,
+    ):
+        """
+        Renames conv{2-7} keys of state dicts saved before stages were held in a list
+        to stages.{0-5}
+
+        Arg(s):
+            state_dict : dict
+                state dict being loaded
+            prefix : str
+                prefix of this module in state dict
+            local_metadata : dict
+                metadata of this module
+            strict : bool
+                whether keys must match exactly
+            missing_keys : list[str]
+                keys missing from state dict
+            unexpected_keys : list[str]
+                unexpected keys in state dict
+            error_msgs : list[str]
+                error messages
+        """
+
+        renames = [
+            ("conv{}.".format(n + 2), "stages.{}.".format(n))
+            for n in range(len(self.stages))
+        ]
+
+        net_utils.rename_state_dict_keys(state_dict, prefix, renames)
 
     def forward(self, x):
         """
@@ -1501,34 +1561,52 @@ class VGGNetEncoder(torch.nn.Module):
                 N x C x H x W input tensor
         Returns:
             torch.Tensor[float32] : N x K x h x w output tensor
+            tuple[torch.Tensor[float32]] : skip connections, list if scripted
         """
 
-        layers = [x]
+        if self.use_channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
 
-        # Resolution 1/1 -> 1/2
-        layers.append(self.conv1(layers[-1]))
+        # TorchScript does not support automatic mixed precision contexts
+        if self.use_mixed_precision and not torch.jit.is_scripting():
+            # bfloat16 has the range of float32, so gradients need no loss scaling
+            with net_utils.autocast(enabled=True, dtype=torch.bfloat16):
+                latent, skips = self.encode(x)
 
-        # Resolution 1/2 -> 1/4
-        layers.append(self.conv2(layers[-1]))
+            # Return features in the precision of the inputs
+            latent = latent.to(x.dtype)
+            skips = [skip.to(x.dtype) for skip in skips]
+        else:
+            latent, skips = self.encode(x)
 
-        # Resolution 1/4 -> 1/8
-        layers.append(self.conv3(layers[-1]))
+        # TorchScript only supports tuples of fixed length, so return a list there
+        if torch.jit.is_scripting():
+            return latent, skips
 
-        # Resolution 1/8 -> 1/32
-        layers.append(self.conv4(layers[-1]))
+        return latent, tuple(skips)
 
-        # Resolution 1/16 -> 1/32
-        layers.append(self.conv5(layers[-1]))
+    def encode(self, x):
+        """
+        Forward input x through convolutions of encoder
+
+        Arg(s):
+            x : torch.Tensor[float32]
+                N x C x H x W input tensor
+        Returns:
+            torch.Tensor[float32] : N x K x h x w output tensor
+            list[torch.Tensor[float32]] : list of skip connections
+        """
 
-        # Resolution 1/32 -> 1/64
-        if self.conv6 is not None:
-            layers.append(self.conv6(layers[-1]))
+        # Resolution 1/1 -> 1/2
+        x = self.conv1(x)
+        skips = []
 
-        # Resolution 1/64 -> 1/128
-        if self.conv7 is not None:
-            layers.append(self.conv7(layers[-1]))
+        # Each stage halves resolution, its input is a skip connection
+        for stage in self.stages:
+            skips.append(x)
+            x = stage(x)
 
-        return layers[-1], layers[1:-1]
+        return x, skips
 
 
 class AtrousVGGNetEncoder(torch.nn.Module):
@@ -1550,6 +1628,13 @@ class AtrousVGGNetEncoder(torch.nn.Module):
             if set, then apply batch normalization
         use_instance_norm : bool
             if set, then apply instance normalization
+        use_channels_last : bool
+            if set, then run convolutions in channels last (N x H x W x C) memory format
+        use_mixed_precision : bool
+            if set, then run convolutions in bfloat16 with automatic mixed precision
+        use_shared_atrous_spatial_pyramid_pool : bool
+            if set, then replace the dilated stages at 1/8 resolution with a single
+            depthwise separable ASPP, whose output is also the 1/8 skip connection
     """
 
     def __init__(
@@ -1561,9 +1646,18 @@ class AtrousVGGNetEncoder(torch.nn.Module):
         activation_func="leaky_relu",
         use_batch_norm=False,
         use_instance_norm=False,
+        use_channels_last=False,
+        use_mixed_precision=False,
+        use_shared_atrous_spatial_pyramid_pool=False,
     ):
         super(AtrousVGGNetEncoder, self).__init__()
 
+        self.use_channels_last = use_channels_last
+        self.use_mixed_precision = use_mixed_precision
+        self.use_shared_atrous_spatial_pyramid_pool = (
+            use_shared_atrous_spatial_pyramid_pool
+        )
+
         if n_layer == 8:
             n_convolutions = [1, 1, 1, 1, 1]
         elif n_layer == 11:
@@ -1575,6 +1669,10 @@ class AtrousVGGNetEncoder(torch.nn.Module):
 
         assert len(n_filters) == len(n_convolutions)
 
+        assert (
+            not use_shared_atrous_spatial_pyramid_pool or n_filters[3] == n_filters[4]
+        ), "Shared ASPP output is used as skip connection, so n_filters[3] must equal n_filters[4]"
+
         activation_func = net_utils.activation_func(activation_func)
         dilation = 2
 
@@ -1636,31 +1734,47 @@ class AtrousVGGNetEncoder(torch.nn.Module):
             use_instance_norm=use_instance_norm,
         )
 
-        # Resolution 1/8 with 2x dilation
-        in_channels, out_channels = [n_filters[2], n_filters[3]]
-        self.conv4 = net_utils.AtrousVGGNetBlock(
-            in_channels,
-            out_channels,
-            n_convolution=n_convolutions[3],
-            dilation=dilation,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+        if use_shared_atrous_spatial_pyramid_pool:
+            # Resolution 1/8 with every dilation rate in one pyramid pool
+            self.atrous_spatial_pyramid_pool = net_utils.AtrousSpatialPyramidPooling(
+                n_filters[2],
+                n_filters[4],
+                dilations=[2, 4, 8],
+                weight_initializer=weight_initializer,
+                activation_func=activation_func,
+                use_batch_norm=use_batch_norm,
+                use_instance_norm=use_instance_norm,
+                use_depthwise_separable=True,
+            )
+        else:
+            # Resolution 1/8 with 2x dilation
+            in_channels, out_channels = [n_filters[2], n_filters[3]]
+            self.conv4 = net_utils.AtrousVGGNetBlock(
+                in_channels,
+                out_channels,
+                n_convolution=n_convolutions[3],
+                dilation=dilation,
+                weight_initializer=weight_initializer,
+                activation_func=activation_func,
+                use_batch_norm=use_batch_norm,
+                use_instance_norm=use_instance_norm,
+            )
 
-        # Resolution 1/8 with 4x dilation
-        in_channels, out_channels = [n_filters[3], n_filters[4]]
-        self.conv5 = net_utils.AtrousVGGNetBlock(
-            in_channels,
-            out_channels,
-            n_convolution=n_convolutions[4],
-            dilation=dilation,
-            weight_initializer=weight_initializer,
-            activation_func=activation_func,
-            use_batch_norm=use_batch_norm,
-            use_instance_norm=use_instance_norm,
-        )
+            # Resolution 1/8 with 4x dilation
+            in_channels, out_channels = [n_filters[3], n_filters[4]]
+            self.conv5 = net_utils.AtrousVGGNetBlock(
+                in_channels,
+                out_channels,
+                n_convolution=n_convolutions[4],
+                dilation=dilation,
+                weight_initializer=weight_initializer,
+                activation_func=activation_func,
+                use_batch_norm=use_batch_norm,
+                use_instance_norm=use_instance_norm,
+            )
+
+        if use_channels_last:
+            self.to(memory_format=torch.channels_last)
 
     def forward(self, x):
         """
@@ -1671,26 +1785,61 @@ class AtrousVGGNetEncoder(torch.nn.Module):
                 N x C x H x W input tensor
         Returns:
             torch.Tensor[float32] : N x K x h x w output tensor
+            tuple[torch.Tensor[float32]] : skip connections
+        """
+
+        if self.use_channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+
+        # TorchScript does not support automatic mixed precision contexts
+        if self.use_mixed_precision and not torch.jit.is_scripting():
+            # bfloat16 has the range of float32, so gradients need no loss scaling
+            with net_utils.autocast(enabled=True, dtype=torch.bfloat16):
+                latent, skips = self.encode(x)
+
+            # Return features in the precision of the inputs
+            latent = latent.to(x.dtype)
+            skips = tuple(skip.to(x.dtype) for skip in skips)
+        else:
+            latent, skips = self.encode(x)
+
+        return latent, skips
+
+    def encode(self, x):
         """
+        Forward input x through convolutions of encoder
 
-        layers = [x]
+        Arg(s):
+            x : torch.Tensor[float32]
+                N x C x H x W input tensor
+        Returns:
+            torch.Tensor[float32] : N x K x h x w output tensor
+            tuple[torch.Tensor[float32]] : skip connections
+        """
 
         # Resolution 1/1 -> 1/2
-        layers.append(self.conv1(layers[-1]))
+        x1 = self.conv1(x)
 
         # Resolution 1/2 -> 1/4
-        layers.append(self.conv2(layers[-1]))
+        x2 = self.conv2(x1)
 
         # Resolution 1/4 -> 1/8
-        layers.append(self.conv3(layers[-1]))
+        x3 = self.conv3(x2)
+
+        if self.use_shared_atrous_spatial_pyramid_pool:
+            # Resolution 1/8 with all dilations applied in parallel
+            x5 = self.atrous_spatial_pyramid_pool(x3)
+
+            # Decoder expects a skip connection at 1/8 resolution after dilations
+            return x5, (x1, x2, x3, x5)
 
         # Resolution 1/8 with 2x dilation
-        layers.append(self.conv4(layers[-1]))
+        x4 = self.conv4(x3)
 
         # Resolution 1/8 with 4x dilation
-        layers.append(self.conv5(layers[-1]))
+        x5 = self.conv5(x4)
 
-        return layers[-1], layers[1:-1]
+        return x5, (x1, x2, x3, x4)
 
 
 """
@@ -1724,7 +1873,21 @@ class MultiScaleDecoder(torch.nn.Module):
         use_instance_norm : bool
             if set, then apply instance normalization
         deconv_type : str
-            deconvolution types available: transpose, up
+            deconvolution types available: transpose, up, subpixel
+        use_output_projection : bool
+            if set, then add a learned 2x upsampling of each lower resolution output
+            to the next decoder block instead of concatenating its bilinear upsampling
+        use_channels_last : bool
+            if set, then run convolutions in channels last (N x H x W x C) memory format
+        use_mixed_precision : bool
+            if set, then run convolutions in bfloat16 with automatic mixed precision
+        use_gradient_checkpointing : bool
+            if set, then recompute activations of decoder blocks in backward instead
+            of storing them, only applies to training
+        reuse_concat_buffers : bool
+            if set, then concatenate skip connections into buffers kept from previous
+            calls of the same shape instead of allocating new ones, only applies
+            when gradients are not needed
     """
 
     def __init__(
@@ -1740,6 +1903,11 @@ class MultiScaleDecoder(torch.nn.Module):
         use_batch_norm=False,
         use_instance_norm=False,
         deconv_type="transpose",
+        use_output_projection=False,
+        use_channels_last=False,
+        use_mixed_precision=False,
+        use_gradient_checkpointing=False,
+        reuse_concat_buffers=False,
     ):
         super(MultiScaleDecoder, self).__init__()
 
@@ -1750,6 +1918,10 @@ class MultiScaleDecoder(torch.nn.Module):
 
         self.n_resolution = n_resolution
         self.output_func = output_func
+        self.use_output_projection = use_output_projection
+        self.use_channels_last = use_channels_last
+        self.use_mixed_precision = use_mixed_precision
+        self.use_gradient_checkpointing = use_gradient_checkpointing
 
         activation_func = net_utils.activation_func(activation_func)
         output_func = net_utils.activation_func(output_func)
@@ -1758,6 +1930,10 @@ class MultiScaleDecoder(torch.nn.Module):
         if "upsample" in self.output_func and self.n_resolution < 2:
             self.n_resolution = 2
 
+        assert not (
+            "upsample" in self.output_func and use_output_projection
+        ), "Unable to upsample output to full resolution with output projection"
+
         filter_idx = 0
 
         in_channels, skip_channels, out_channels = [
@@ -1777,6 +1953,7 @@ class MultiScaleDecoder(torch.nn.Module):
                 use_batch_norm=use_batch_norm,
                 use_instance_norm=use_instance_norm,
                 deconv_type=deconv_type,
+                reuse_concat_buffers=reuse_concat_buffers,
             )
 
             filter_idx = filter_idx + 1
@@ -1800,6 +1977,7 @@ class MultiScaleDecoder(torch.nn.Module):
                 use_batch_norm=use_batch_norm,
                 use_instance_norm=use_instance_norm,
                 deconv_type=deconv_type,
+                reuse_concat_buffers=reuse_concat_buffers,
             )
 
             filter_idx = filter_idx + 1
@@ -1823,6 +2001,7 @@ class MultiScaleDecoder(torch.nn.Module):
                 use_batch_norm=use_batch_norm,
                 use_instance_norm=use_instance_norm,
                 deconv_type=deconv_type,
+                reuse_concat_buffers=reuse_concat_buffers,
             )
 
             filter_idx = filter_idx + 1
@@ -1846,6 +2025,7 @@ class MultiScaleDecoder(torch.nn.Module):
                 use_batch_norm=use_batch_norm,
                 use_instance_norm=use_instance_norm,
                 deconv_type=deconv_type,
+                reuse_concat_buffers=reuse_concat_buffers,
             )
 
             if self.n_resolution > 3:
@@ -1871,7 +2051,15 @@ class MultiScaleDecoder(torch.nn.Module):
                 n_filters[filter_idx],
             ]
 
-            if self.n_resolution > 3:
+            if self.n_resolution > 3 and use_output_projection:
+                self.output_projection3 = net_utils.TransposeConv2d(
+                    output_channels,
+                    out_channels,
+                    kernel_size=3,
+                    weight_initializer=weight_initializer,
+                    activation_func=None,
+                )
+            elif self.n_resolution > 3:
                 skip_channels = skip_channels + output_channels
         else:
             self.deconv3 = None
@@ -1886,6 +2074,7 @@ class MultiScaleDecoder(torch.nn.Module):
                 use_batch_norm=use_batch_norm,
                 use_instance_norm=use_instance_norm,
                 deconv_type=deconv_type,
+                reuse_concat_buffers=reuse_concat_buffers,
             )
 
             if self.n_resolution > 2:
@@ -1911,7 +2100,15 @@ class MultiScaleDecoder(torch.nn.Module):
                 n_filters[filter_idx],
             ]
 
-            if self.n_resolution > 2:
+            if self.n_resolution > 2 and use_output_projection:
+                self.output_projection2 = net_utils.TransposeConv2d(
+                    output_channels,
+                    out_channels,
+                    kernel_size=3,
+                    weight_initializer=weight_initializer,
+                    activation_func=None,
+                )
+            elif self.n_resolution > 2:
                 skip_channels = skip_channels + output_channels
         else:
             self.deconv2 = None
@@ -1925,6 +2122,7 @@ class MultiScaleDecoder(torch.nn.Module):
             use_batch_norm=use_batch_norm,
             use_instance_norm=use_instance_norm,
             deconv_type=deconv_type,
+            reuse_concat_buffers=reuse_concat_buffers,
         )
 
         if self.n_resolution > 1:
@@ -1950,7 +2148,15 @@ class MultiScaleDecoder(torch.nn.Module):
             n_filters[filter_idx],
         ]
 
-        if self.n_resolution > 1:
+        if self.n_resolution > 1 and use_output_projection:
+            self.output_projection1 = net_utils.TransposeConv2d(
+                output_channels,
+                out_channels,
+                kernel_size=3,
+                weight_initializer=weight_initializer,
+                activation_func=None,
+            )
+        elif self.n_resolution > 1:
             skip_channels = skip_channels + output_channels
 
         self.deconv0 = net_utils.DecoderBlock(
@@ -1962,6 +2168,7 @@ class MultiScaleDecoder(torch.nn.Module):
             use_batch_norm=use_batch_norm,
             use_instance_norm=use_instance_norm,
             deconv_type=deconv_type,
+            reuse_concat_buffers=reuse_concat_buffers,
         )
 
         self.output0 = net_utils.Conv2d(
@@ -1975,6 +2182,9 @@ class MultiScaleDecoder(torch.nn.Module):
             use_instance_norm=False,
         )
 
+        if use_channels_last:
+            self.to(memory_format=torch.channels_last)
+
     def forward(self, x, skips, shape=None):
         """
         Forward latent vector x through decoder network
@@ -1983,121 +2193,148 @@ class MultiScaleDecoder(torch.nn.Module):
             x : torch.Tensor[float32]
                 latent vector
             skips : list[torch.Tensor[float32]]
-                list of skip connection tensors (earlier are larger resolution)
+                list of skip connection tensors (earlier are larger resolution),
+                each may also be a list of tensors to concatenate along channels
+            shape : tuple[int]
+                (height, width) tuple denoting output size
+        Returns:
+            list[torch.Tensor[float32]] : list of outputs at multiple scales
+        """
+
+        # Skip connections need not be converted, convolutions run in channels last
+        # if either their inputs or weights are
+        if self.use_channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+
+        if self.use_mixed_precision:
+            # bfloat16 has the range of float32, so gradients need no loss scaling
+            with net_utils.autocast(enabled=True, dtype=torch.bfloat16):
+                outputs = self.decode(x, skips, shape=shape)
+
+            # Return outputs in the precision of the inputs
+            outputs = [output.to(x.dtype) for output in outputs]
+        else:
+            outputs = self.decode(x, skips, shape=shape)
+
+        return outputs
+
+    def compile_for_shape(self, x, skips, shape=None, mode="max-autotune"):
+        """
+        Compiles decoder in place with torch.compile (PyTorch 2.2 or later),
+        specialized to the shapes of the example inputs, so that branches on the
+        configuration are resolved once and blocks are fused into a single graph.
+        Runs the example inputs once to compile; inputs of other shapes recompile.
+        Only for inference at a fixed resolution, see KBNetModel.compile_decoder
+
+        Arg(s):
+            x : torch.Tensor[float32]
+                example latent vector
+            skips : list[torch.Tensor[float32]]
+                list of example skip connection tensors
+            shape : tuple[int]
+                (height, width) tuple denoting output size
+            mode : str
+                torch.compile mode: default, reduce-overhead, max-autotune
+        """
+
+        self.compile(mode=mode, dynamic=False)
+
+        with torch.no_grad():
+            self(x, skips, shape=shape)
+
+    def decode(self, x, skips, shape=None):
+        """
+        Forward latent vector x through decoder blocks and output convolutions
+
+        Arg(s):
+            x : torch.Tensor[float32]
+                latent vector
+            skips : list[torch.Tensor[float32]]
+                list of skip connection tensors (earlier are larger resolution),
+                each may also be a list of tensors to concatenate along channels
             shape : tuple[int]
                 (height, width) tuple denoting output size
         Returns:
             list[torch.Tensor[float32]] : list of outputs at multiple scales
         """
 
-        layers = [x]
+        # Only outputs are kept, decoder features are rebound to x and freed once used
         outputs = []
 
+        # Learned upsampling of the last output, added to the next decoder block
+        projection = None
+
+        # Otherwise the last output is upsampled and concatenated to skip connections
+        use_upsample_output3 = self.n_resolution > 3 and not self.use_output_projection
+        use_upsample_output2 = self.n_resolution > 2 and not self.use_output_projection
+
         # Start at the end and walk backwards through skip connections
         n = len(skips) - 1
 
         # Resolution 1/128 -> 1/64
         if self.deconv6 is not None:
-            layers.append(self.deconv6(layers[-1], skips[n]))
+            x = self.forward_block(self.deconv6, x, skips[n])
             n = n - 1
 
         # Resolution 1/64 -> 1/32
         if self.deconv5 is not None:
-            layers.append(self.deconv5(layers[-1], skips[n]))
+            x = self.forward_block(self.deconv5, x, skips[n])
             n = n - 1
 
         # Resolution 1/32 -> 1/16
         if self.deconv4 is not None:
-            layers.append(self.deconv4(layers[-1], skips[n]))
+            x = self.forward_block(self.deconv4, x, skips[n])
             n = n - 1
 
         # Resolution 1/16 -> 1/8
         if self.deconv3 is not None:
-            layers.append(self.deconv3(layers[-1], skips[n]))
+            x = self.forward_block(self.deconv3, x, skips[n])
 
             if self.n_resolution > 3:
-                output3 = self.output3(layers[-1])
+                output3 = self.output3(x)
                 outputs.append(output3)
 
-                if n > 0:
-                    upsample_output3 = torch.nn.functional.interpolate(
-                        input=outputs[-1],
-                        size=skips[n - 1].shape[-2:],
-                        mode="bilinear",
-                        align_corners=True,
-                    )
+                if self.use_output_projection:
+                    projection = self.output_projection3(output3)
                 else:
-                    upsample_output3 = torch.nn.functional.interpolate(
-                        input=outputs[-1],
-                        scale_factor=2,
-                        mode="bilinear",
-                        align_corners=True,
-                    )
+                    upsample_output3 = self.upsample_output(output3, skips, n)
 
             n = n - 1
 
         # Resolution 1/8 -> 1/4
         if self.deconv2 is not None:
-            if skips[n] is not None:
-                skip = (
-                    torch.cat([skips[n], upsample_output3], dim=1)
-                    if self.n_resolution > 3
-                    else skips[n]
-                )
+            if use_upsample_output3 and skips[n] is not None:
+                skip = net_utils.skip_connection_list(skips[n]) + [upsample_output3]
             else:
                 skip = skips[n]
-            layers.append(self.deconv2(layers[-1], skip))
+            x = self.forward_block(self.deconv2, x, skip, projection=projection)
 
             if self.n_resolution > 2:
-                output2 = self.output2(layers[-1])
+                output2 = self.output2(x)
                 outputs.append(output2)
 
-                if n > 0:
-                    upsample_output2 = torch.nn.functional.interpolate(
-                        input=outputs[-1],
-                        size=skips[n - 1].shape[-2:],
-                        mode="bilinear",
-                        align_corners=True,
-                    )
+                if self.use_output_projection:
+                    projection = self.output_projection2(output2)
                 else:
-                    upsample_output2 = torch.nn.functional.interpolate(
-                        input=outputs[-1],
-                        scale_factor=2,
-                        mode="bilinear",
-                        align_corners=True,
-                    )
+                    upsample_output2 = self.upsample_output(output2, skips, n)
 
             n = n - 1
 
         # Resolution 1/4 -> 1/2
-        if skips[n] is not None:
-            skip = (
-                torch.cat([skips[n], upsample_output2], dim=1)
-                if self.n_resolution > 2
-                else skips[n]
-            )
+        if use_upsample_output2 and skips[n] is not None:
+            skip = net_utils.skip_connection_list(skips[n]) + [upsample_output2]
         else:
             skip = skips[n]
-        layers.append(self.deconv1(layers[-1], skip))
+        x = self.forward_block(self.deconv1, x, skip, projection=projection)
 
         if self.n_resolution > 1:
-            output1 = self.output1(layers[-1])
+            output1 = self.output1(x)
             outputs.append(output1)
 
-            if n > 0:
-                upsample_output1 = torch.nn.functional.interpolate(
-                    input=outputs[-1],
-                    size=skips[n - 1].shape[-2:],
-                    mode="bilinear",
-                    align_corners=True,
-                )
+            if self.use_output_projection:
+                projection = self.output_projection1(output1)
             else:
-                upsample_output1 = torch.nn.functional.interpolate(
-                    input=outputs[-1],
-                    scale_factor=2,
-                    mode="bilinear",
-                    align_corners=True,
-                )
+                upsample_output1 = self.upsample_output(output1, skips, n)
 
         # Resolution 1/2 -> 1/1
         n = n - 1
@@ -2105,29 +2342,93 @@ class MultiScaleDecoder(torch.nn.Module):
         if "upsample" in self.output_func:
             output0 = upsample_output1
         else:
-            if self.n_resolution > 1:
+            if self.n_resolution > 1 and self.use_output_projection:
+                skip = skips[n] if n == 0 else None
+                x = self.forward_block(self.deconv0, x, skip, projection=projection)
+            elif self.n_resolution > 1:
                 # If there is skip connection at layer 0
                 if skips[n] is not None and n == 0:
-                    skip = (
-                        torch.cat([skips[n], upsample_output1], dim=1)
-                        if n == 0
-                        else upsample_output1
-                    )
+                    skip = net_utils.skip_connection_list(skips[n]) + [upsample_output1]
                 else:
                     skip = upsample_output1
-                layers.append(self.deconv0(layers[-1], skip))
+                x = self.forward_block(self.deconv0, x, skip)
             else:
                 if skips[n] is not None and n == 0:
-                    layers.append(self.deconv0(layers[-1], skips[n]))
+                    x = self.forward_block(self.deconv0, x, skips[n])
                 else:
-                    layers.append(self.deconv0(layers[-1], shape=shape[-2:]))
+                    x = self.forward_block(self.deconv0, x, shape=shape[-2:])
 
-            output0 = self.output0(layers[-1])
+            output0 = self.output0(x)
 
         outputs.append(output0)
 
         return outputs
 
+    def upsample_output(self, output, skips, n):
+        """
+        Bilinearly upsample output to the resolution of the next skip connection,
+        or by a factor of 2 if there is none
+
+        Arg(s):
+            output : torch.Tensor[float32]
+                N x C x h x w output
+            skips : list[torch.Tensor[float32]]
+                list of skip connection tensors (earlier are larger resolution)
+            n : int
+                index of skip connection used by the decoder block of the output
+        Returns:
+            torch.Tensor[float32] : N x C x H x W upsampled output
+        """
+
+        # Interpolation computes sample positions from the output index, which is
+        # cheaper than caching a sampling grid and reading it with grid_sample
+        if n > 0:
+            return torch.nn.functional.interpolate(
+                input=output,
+                size=net_utils.skip_connection_list(skips[n - 1])[0].shape[-2:],
+                mode="bilinear",
+                align_corners=True,
+            )
+        else:
+            return torch.nn.functional.interpolate(
+                input=output,
+                scale_factor=2,
+                mode="bilinear",
+                align_corners=True,
+            )
+
+    def forward_block(self, block, x, skip=None, shape=None, projection=None):
+        """
+        Forward input x through a decoder block, without storing its activations
+        if gradient checkpointing is enabled
+
+        Arg(s):
+            block : torch.nn.Module
+                decoder block
+            x : torch.Tensor[float32]
+                N x C x h x w input tensor
+            skip : torch.Tensor[float32] or list[torch.Tensor[float32]]
+                skip connection tensor(s) to concatenate with upsampled input
+            shape : tuple[int]
+                height, width (H, W) tuple denoting output shape
+            projection : torch.Tensor[float32]
+                N x K x H x W tensor added to output of deconvolution
+        Returns:
+            torch.Tensor[float32] : N x K x H x W output tensor
+        """
+
+        if self.use_gradient_checkpointing and self.training and x.requires_grad:
+            return torch.utils.checkpoint.checkpoint(
+                block,
+                x,
+                skip,
+                shape,
+                projection,
+                use_reentrant=False,
+            )
+
+        return block(x, skip, shape, projection)
+
 
 class PoseDecoder(torch.nn.Module):
     """
@@ -2148,6 +2449,8 @@ class PoseDecoder(torch.nn.Module):
             if set, then apply batch normalization
         use_instance_norm : bool
             if set, then apply instance normalization
+        use_depthwise_separable : bool
+            if set, then use depthwise separable convolutions instead of convolutions
     """
 
     def __init__(
@@ -2159,6 +2462,7 @@ class PoseDecoder(torch.nn.Module):
         activation_func="leaky_relu",
         use_batch_norm=False,
         use_instance_norm=False,
+        use_depthwise_separable=False,
     ):
         super(PoseDecoder, self).__init__()
 
@@ -2166,12 +2470,17 @@ class PoseDecoder(torch.nn.Module):
 
         activation_func = net_utils.activation_func(activation_func)
 
+        if use_depthwise_separable:
+            conv2d = net_utils.DepthwiseSeparableConv2d
+        else:
+            conv2d = net_utils.Conv2d
+
         if len(n_filters) > 0:
             layers = []
             in_channels = input_channels
 
             for out_channels in n_filters:
-                conv = net_utils.Conv2d(
+                conv = conv2d(
                     in_channels=in_channels,
                     out_channels=out_channels,
                     kernel_size=3,
@@ -2210,8 +2519,16 @@ class PoseDecoder(torch.nn.Module):
             )
 
     def forward(self, x):
-        conv_output = self.conv(x)
-        pose_mean = torch.mean(conv_output, [2, 3])
+        if isinstance(self.conv, torch.nn.Sequential):
+            x = self.conv[:-1](x)
+            conv_pose = self.conv[-1]
+        else:
+            conv_pose = self.conv
+
+        # Last 1 x 1 convolution is linear, so averaging over pixels before it gives
+        # the same pose while only convolving a single pixel
+        x = torch.nn.functional.adaptive_avg_pool2d(x, 1)
+        pose_mean = torch.flatten(conv_pose(x), start_dim=1)
         dof = 0.01 * pose_mean
         posemat = net_utils.pose_matrix(
             dof, rotation_parameterization=self.rotation_parameterization
@@ -2240,6 +2557,9 @@ class SparseToDensePool(torch.nn.Module):
             kaiming_normal, kaiming_uniform, xavier_normal, xavier_uniform
         activation_func : func
             activation function after convolution
+        use_channels_last : bool
+            if set, then run pooling and convolutions in channels last (N x H x W x C)
+            memory format
     """
 
     def __init__(
@@ -2251,29 +2571,18 @@ class SparseToDensePool(torch.nn.Module):
         n_convolution=3,
         weight_initializer="kaiming_uniform",
         activation_func="leaky_relu",
+        use_channels_last=False,
     ):
         super(SparseToDensePool, self).__init__()
 
+        self.use_channels_last = use_channels_last
+
         activation_func = net_utils.activation_func(activation_func)
 
         self.min_pool_sizes = [s for s in min_pool_sizes if s > 1]
 
         self.max_pool_sizes = [s for s in max_pool_sizes if s > 1]
 
-        # Construct min pools
-        self.min_pools = []
-        for s in self.min_pool_sizes:
-            padding = s // 2
-            pool = torch.nn.MaxPool2d(kernel_size=s, stride=1, padding=padding)
-            self.min_pools.append(pool)
-
-        # Construct max pools
-        self.max_pools = []
-        for s in self.max_pool_sizes:
-            padding = s // 2
-            pool = torch.nn.MaxPool2d(kernel_size=s, stride=1, padding=padding)
-            self.max_pools.append(pool)
-
         self.len_pool_sizes = len(self.min_pool_sizes) + len(self.max_pool_sizes)
 
         in_channels = len(self.min_pool_sizes) + len(self.max_pool_sizes)
@@ -2310,28 +2619,24 @@ class SparseToDensePool(torch.nn.Module):
             use_instance_norm=False,
         )
 
+        if use_channels_last:
+            self.to(memory_format=torch.channels_last)
+
     def forward(self, x):
         # Input depth
         z = torch.unsqueeze(x[:, 0, ...], dim=1)
 
-        pool_pyramid = []
+        # Pools preserve the memory format, so the pyramid is also channels last
+        if self.use_channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+            z = z.contiguous(memory_format=torch.channels_last)
 
         # Use min and max pooling to densify and increase receptive field
-        for pool, s in zip(self.min_pools, self.min_pool_sizes):
-            # Set flag (999) for any zeros and max pool on -z then revert the values
-            z_pool = -pool(torch.where(z == 0, -999 * torch.ones_like(z), -z))
-            # Remove any 999 from the results
-            z_pool = torch.where(z_pool == 999, torch.zeros_like(z), z_pool)
-
-            pool_pyramid.append(z_pool)
-
-        for pool, s in zip(self.max_pools, self.max_pool_sizes):
-            z_pool = pool(z)
-
-            pool_pyramid.append(z_pool)
+        min_pools = net_utils.min_pool2d_nonzero(z, self.min_pool_sizes)
+        max_pools = net_utils.max_pool2d_cascade(z, self.max_pool_sizes)
 
         # Stack max and minpools into pyramid
-        pool_pyramid = torch.cat(pool_pyramid, dim=1)
+        pool_pyramid = torch.cat(min_pools + max_pools, dim=1)
 
         # Learn weights for different kernel sizes, and near and far structures
         pool_convs = self.pool_convs(pool_pyramid)
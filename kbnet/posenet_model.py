@@ -31,6 +31,18 @@ class PoseNetModel(object):
             kaiming_normal, kaiming_uniform, xavier_normal, xavier_uniform
         activation_func : str
             activation function for network
+        use_mixed_precision : bool
+            if set, then run convolutions of encoder with automatic mixed precision,
+            float16 for posenet and bfloat16 for resnet18 and resnet34
+        use_channels_last : bool
+            if set, then run convolutions of encoder in channels last memory format
+        use_torchscript : bool
+            if set, then compile encoder with TorchScript to reduce Python overhead
+        use_compile : bool
+            if set, then compile encoder with torch.compile (PyTorch 2.2 or later) to
+            fuse convolution epilogues, cannot be used with use_torchscript
+        distributed : bool
+            if set, then use DistributedDataParallel (one process per GPU)
         device : torch.device
             device for running model
     """
@@ -41,6 +53,11 @@ class PoseNetModel(object):
         rotation_parameterization="axis",
         weight_initializer="xavier_normal",
         activation_func="leaky_relu",
+        use_mixed_precision=False,
+        use_channels_last=False,
+        use_torchscript=False,
+        use_compile=False,
+        distributed=False,
         device=torch.device("cuda"),
     ):
         self.device = device
@@ -53,6 +70,8 @@ class PoseNetModel(object):
                 weight_initializer=weight_initializer,
                 activation_func=activation_func,
                 use_batch_norm=True,
+                use_mixed_precision=use_mixed_precision,
+                use_channels_last=use_channels_last,
             )
         elif encoder_type == "resnet18":
             self.encoder = networks.ResNetEncoder(
@@ -62,6 +81,8 @@ class PoseNetModel(object):
                 weight_initializer=weight_initializer,
                 activation_func=activation_func,
                 use_batch_norm=True,
+                use_mixed_precision=use_mixed_precision,
+                use_channels_last=use_channels_last,
             )
         elif encoder_type == "resnet34":
             self.encoder = networks.ResNetEncoder(
@@ -71,12 +92,32 @@ class PoseNetModel(object):
                 weight_initializer=weight_initializer,
                 activation_func=activation_func,
                 use_batch_norm=True,
+                use_mixed_precision=use_mixed_precision,
+                use_channels_last=use_channels_last,
             )
         else:
             raise ValueError(
                 "Unsupported PoseNet encoder type: {}".format(encoder_type)
             )
 
+        # Scripted modules do not run load state dict pre hooks, which rename keys of
+        # older checkpoints, so weights are restored into the eager encoder, whose
+        # parameters and buffers are shared with the scripted encoder
+        self.use_torchscript = use_torchscript
+        self.encoder_eager = self.encoder
+
+        # Later layers operate on small inputs and are bound by Python overhead
+        if use_torchscript:
+            self.encoder = torch.jit.script(self.encoder)
+
+        # Compile in place so that state dict keys are unchanged. CUDA graphs of
+        # reduce-overhead mode would overwrite outputs of the first forward pass of
+        # each step with those of the second, so use the default mode
+        if use_compile:
+            assert not use_torchscript, "Cannot use both TorchScript and torch.compile"
+
+            self.encoder.compile()
+
         # Create pose decoder
         if encoder_type == "posenet":
             self.decoder = networks.PoseDecoder(
@@ -99,8 +140,12 @@ class PoseNetModel(object):
             )
 
         # Move to device
-        self.data_parallel()
-        self.to(self.device)
+        if distributed:
+            self.to(self.device)
+            self.distributed_data_parallel()
+        else:
+            self.data_parallel()
+            self.to(self.device)
 
     def forward(self, image0, image1):
         """
@@ -198,7 +243,17 @@ class PoseNetModel(object):
         checkpoint = torch.load(checkpoint_path, map_location=self.device)
 
         # Restore encoder and decoder weights
-        self.encoder.load_state_dict(checkpoint["encoder_state_dict"])
+        if self.use_torchscript:
+            encoder_state_dict = checkpoint["encoder_state_dict"]
+
+            # Remove prefix of DataParallel or DistributedDataParallel
+            torch.nn.modules.utils.consume_prefix_in_state_dict_if_present(
+                encoder_state_dict, "module."
+            )
+            self.encoder_eager.load_state_dict(encoder_state_dict)
+        else:
+            self.encoder.load_state_dict(checkpoint["encoder_state_dict"])
+
         self.decoder.load_state_dict(checkpoint["decoder_state_dict"])
 
         if optimizer is not None:
@@ -214,3 +269,20 @@ class PoseNetModel(object):
 
         self.encoder = torch.nn.DataParallel(self.encoder)
         self.decoder = torch.nn.DataParallel(self.decoder)
+
+    def distributed_data_parallel(self):
+        """
+        Allows multi-gpu split along batch with one process per GPU,
+        requires the default process group to be initialized
+        """
+
+        device_ids = None if self.device.type == "cpu" else [self.device]
+
+        # Projections of ResNet blocks are only used by strided blocks, so those
+        # of other blocks get no gradient and must not be waited on in reduction
+        self.encoder = torch.nn.parallel.DistributedDataParallel(
+            self.encoder, device_ids=device_ids, find_unused_parameters=True
+        )
+        self.decoder = torch.nn.parallel.DistributedDataParallel(
+            self.decoder, device_ids=device_ids
+        )
@@ -0,0 +1,218 @@
+"""
+Author: Alex Wong <alexw@cs.ucla.edu>
+
+If you use this code, please cite the following paper:
+
+A. Wong, and S. Soatto. Unsupervised Depth Completion with Calibrated Backprojection Layers.
+https://arxiv.org/pdf/2108.10531.pdf
+
+@inproceedings{wong2021unsupervised,
+  title={Unsupervised Depth Completion with Calibrated Backprojection Layers},
+  author={Wong, Alex and Soatto, Stefano},
+  booktitle={Proceedings of the IEEE/CVF International Conference on Computer Vision},
+  pages={12747--12756},
+  year={2021}
+}
+"""
+import argparse
+from kbnet import global_constants as settings
+from kbnet.kbnet import quantize
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "--image_path",
+    type=str,
+    required=True,
+    help="Path to list of calibration image paths",
+)
+parser.add_argument(
+    "--sparse_depth_path",
+    type=str,
+    required=True,
+    help="Path to list of sparse depth paths",
+)
+parser.add_argument(
+    "--intrinsics_path",
+    type=str,
+    required=True,
+    help="Path to list of camera intrinsics paths",
+)
+# Input settings
+parser.add_argument(
+    "--input_channels_image", type=int, default=3, help="Number of input image channels"
+)
+parser.add_argument(
+    "--input_channels_depth", type=int, default=2, help="Number of input depth channels"
+)
+parser.add_argument(
+    "--normalized_image_range",
+    nargs="+",
+    type=float,
+    default=[0, 1],
+    help="Range of image intensities after normalization",
+)
+parser.add_argument(
+    "--outlier_removal_kernel_size",
+    type=int,
+    default=7,
+    help="Kernel size to filter outlier sparse depth",
+)
+parser.add_argument(
+    "--outlier_removal_threshold",
+    type=float,
+    default=1.5,
+    help="Difference threshold to consider a point an outlier",
+)
+# Sparse to dense pool settings
+parser.add_argument(
+    "--min_pool_sizes_sparse_to_dense_pool",
+    nargs="+",
+    type=int,
+    default=[3, 7, 9, 11],
+    help="Space delimited list of min pool sizes for sparse to dense pooling",
+)
+parser.add_argument(
+    "--max_pool_sizes_sparse_to_dense_pool",
+    nargs="+",
+    type=int,
+    default=[3, 7, 9, 11],
+    help="Space delimited list of max pool sizes for sparse to dense pooling",
+)
+parser.add_argument(
+    "--n_convolution_sparse_to_dense_pool",
+    type=int,
+    default=3,
+    help="Number of convolutions for sparse to dense pooling",
+)
+parser.add_argument(
+    "--n_filter_sparse_to_dense_pool",
+    type=int,
+    default=8,
+    help="Number of filters for sparse to dense pooling",
+)
+# Depth network settings
+parser.add_argument(
+    "--n_filters_encoder_image",
+    nargs="+",
+    type=int,
+    default=[48, 96, 192, 384, 384],
+    help="Space delimited list of filters to use in each block of image encoder",
+)
+parser.add_argument(
+    "--n_filters_encoder_depth",
+    nargs="+",
+    type=int,
+    default=[16, 32, 64, 128, 128],
+    help="Space delimited list of filters to use in each block of depth encoder",
+)
+parser.add_argument(
+    "--resolutions_backprojection",
+    nargs="+",
+    type=int,
+    default=[0, 1, 2, 3],
+    help="Space delimited list of resolutions to use calibrated backprojection",
+)
+parser.add_argument(
+    "--n_filters_decoder",
+    nargs="+",
+    type=int,
+    default=[256, 128, 128, 64, 12],
+    help="Space delimited list of filters to use in each block of depth decoder",
+)
+parser.add_argument(
+    "--deconv_type",
+    type=str,
+    default="up",
+    help="Deconvolution type: up, transpose, subpixel",
+)
+parser.add_argument(
+    "--min_predict_depth",
+    type=float,
+    default=1.5,
+    help="Minimum value of predicted depth",
+)
+parser.add_argument(
+    "--max_predict_depth",
+    type=float,
+    default=100.0,
+    help="Maximum value of predicted depth",
+)
+# Weight settings
+parser.add_argument(
+    "--weight_initializer",
+    type=str,
+    default="xavier_normal",
+    help="Initialization for weights",
+)
+parser.add_argument(
+    "--activation_func",
+    type=str,
+    default="leaky_relu",
+    help="Activation function after each layer",
+)
+# Quantization settings
+parser.add_argument(
+    "--n_sample_calibration",
+    type=int,
+    default=settings.N_SAMPLE_CALIBRATION,
+    help="Number of samples to calibrate range of activations",
+)
+# Checkpoint settings
+parser.add_argument(
+    "--depth_model_restore_path",
+    type=str,
+    required=True,
+    help="Path to restore depth model from checkpoint",
+)
+parser.add_argument(
+    "--quantized_encoder_path",
+    type=str,
+    default=settings.QUANTIZED_ENCODER_PATH,
+    help="Path to save exported int8 encoder",
+)
+
+args = parser.parse_args()
+
+if __name__ == "__main__":
+    """
+    Assert inputs
+    """
+    # Weight settings
+    args.weight_initializer = args.weight_initializer.lower()
+
+    args.activation_func = args.activation_func.lower()
+
+    quantize(
+        args.image_path,
+        args.sparse_depth_path,
+        args.intrinsics_path,
+        # Input settings
+        input_channels_image=args.input_channels_image,
+        input_channels_depth=args.input_channels_depth,
+        normalized_image_range=args.normalized_image_range,
+        outlier_removal_kernel_size=args.outlier_removal_kernel_size,
+        outlier_removal_threshold=args.outlier_removal_threshold,
+        # Sparse to dense pool settings
+        min_pool_sizes_sparse_to_dense_pool=args.min_pool_sizes_sparse_to_dense_pool,
+        max_pool_sizes_sparse_to_dense_pool=args.max_pool_sizes_sparse_to_dense_pool,
+        n_convolution_sparse_to_dense_pool=args.n_convolution_sparse_to_dense_pool,
+        n_filter_sparse_to_dense_pool=args.n_filter_sparse_to_dense_pool,
+        # Depth network settings
+        n_filters_encoder_image=args.n_filters_encoder_image,
+        n_filters_encoder_depth=args.n_filters_encoder_depth,
+        resolutions_backprojection=args.resolutions_backprojection,
+        n_filters_decoder=args.n_filters_decoder,
+        deconv_type=args.deconv_type,
+        min_predict_depth=args.min_predict_depth,
+        max_predict_depth=args.max_predict_depth,
+        # Weight settings
+        weight_initializer=args.weight_initializer,
+        activation_func=args.activation_func,
+        # Quantization settings
+        n_sample_calibration=args.n_sample_calibration,
+        # Checkpoint settings
+        depth_model_restore_path=args.depth_model_restore_path,
+        quantized_encoder_path=args.quantized_encoder_path,
+    )
@@ -125,7 +125,10 @@ parser.add_argument(
     help="Space delimited list of filters to use in each block of depth decoder",
 )
 parser.add_argument(
-    "--deconv_type", type=str, default="up", help="Deconvolution type: up, transpose"
+    "--deconv_type",
+    type=str,
+    default="up",
+    help="Deconvolution type: up, transpose, subpixel",
 )
 parser.add_argument(
     "--min_predict_depth",
@@ -192,6 +195,41 @@ parser.add_argument(
 parser.add_argument(
     "--device", type=str, default=settings.DEVICE, help="Device to use: gpu, cpu"
 )
+parser.add_argument(
+    "--use_bfloat16",
+    action="store_true",
+    help="If set then convert encoder and decoder weights to bfloat16",
+)
+parser.add_argument(
+    "--use_mixed_precision",
+    action="store_true",
+    help="If set then run encoder in float16 with automatic mixed precision",
+)
+parser.add_argument(
+    "--use_channels_last",
+    action="store_true",
+    help="If set then run convolutions in channels last (N x H x W x C) memory format",
+)
+parser.add_argument(
+    "--use_intrinsics_side_stream",
+    action="store_true",
+    help="If set then invert intrinsics on a side CUDA stream to overlap with first convolutions",
+)
+parser.add_argument(
+    "--reuse_concat_buffers",
+    action="store_true",
+    help="If set then concatenate decoder skip connections into buffers kept across samples",
+)
+parser.add_argument(
+    "--cudnn_benchmark",
+    action="store_true",
+    help="If set then search for fastest convolutions, all inputs must share one resolution",
+)
+parser.add_argument(
+    "--compile_decoder",
+    action="store_true",
+    help="If set then compile decoder for the resolution of the first sample",
+)
 
 
 args = parser.parse_args()
@@ -255,4 +293,11 @@ if __name__ == "__main__":
         keep_input_filenames=args.keep_input_filenames,
         # Hardware settings
         device=args.device,
+        use_bfloat16=args.use_bfloat16,
+        use_mixed_precision=args.use_mixed_precision,
+        use_channels_last=args.use_channels_last,
+        use_intrinsics_side_stream=args.use_intrinsics_side_stream,
+        reuse_concat_buffers=args.reuse_concat_buffers,
+        cudnn_benchmark=args.cudnn_benchmark,
+        compile_decoder=args.compile_decoder,
     )
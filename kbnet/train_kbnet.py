@@ -167,7 +167,7 @@ parser.add_argument(
     "--deconv_type",
     type=str,
     default=settings.DECONV_TYPE,
-    help="Deconvolution type: up, transpose",
+    help="Deconvolution type: up, transpose, subpixel",
 )
 parser.add_argument(
     "--min_predict_depth",
@@ -360,6 +360,41 @@ parser.add_argument(
     default=settings.N_THREAD,
     help="Number of threads for fetching",
 )
+parser.add_argument(
+    "--distributed",
+    action="store_true",
+    help="If set then use one process per GPU with DistributedDataParallel, launch with torchrun",
+)
+parser.add_argument(
+    "--disable_cudnn_benchmark",
+    action="store_true",
+    help="If set then use cuDNN heuristics instead of searching for fastest convolutions",
+)
+parser.add_argument(
+    "--use_pose_side_stream",
+    action="store_true",
+    help="If set then run pose network on a side CUDA stream to overlap with depth network",
+)
+parser.add_argument(
+    "--use_mixed_precision",
+    action="store_true",
+    help="If set then run depth and pose encoders with automatic mixed precision and scale loss",
+)
+parser.add_argument(
+    "--use_channels_last",
+    action="store_true",
+    help="If set then run convolutions in channels last (N x H x W x C) memory format",
+)
+parser.add_argument(
+    "--use_intrinsics_side_stream",
+    action="store_true",
+    help="If set then invert intrinsics on a side CUDA stream to overlap with first convolutions",
+)
+parser.add_argument(
+    "--use_gradient_checkpointing",
+    action="store_true",
+    help="If set then recompute decoder activations in backward to reduce memory",
+)
 
 
 args = parser.parse_args()
@@ -474,4 +509,11 @@ if __name__ == "__main__":
         # Hardware settings
         device=args.device,
         n_thread=args.n_thread,
+        cudnn_benchmark=not args.disable_cudnn_benchmark,
+        distributed=args.distributed,
+        use_pose_side_stream=args.use_pose_side_stream,
+        use_mixed_precision=args.use_mixed_precision,
+        use_channels_last=args.use_channels_last,
+        use_intrinsics_side_stream=args.use_intrinsics_side_stream,
+        use_gradient_checkpointing=args.use_gradient_checkpointing,
     )
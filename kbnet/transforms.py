@@ -326,9 +326,7 @@ class Transforms(object):
             for b, image in enumerate(images):
                 if do_add_noise[b]:
                     shape = image.shape
-                    validity_map = torch.where(
-                        image > 0, torch.ones_like(image), torch.zeros_like(image)
-                    )
+                    validity_map = (image > 0).to(image.dtype)
 
                     if noise_type == "gaussian":
                         image = image + noise_spread * torch.randn(
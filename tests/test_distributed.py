@@ -0,0 +1,100 @@
+import pytest
+import torch
+import torch.multiprocessing
+from kbnet.posenet_model import PoseNetModel
+
+
+N_PROCESS = 2
+N_STEP = 3
+
+
+def init_process_group(rank, init_path):
+    torch.distributed.init_process_group(
+        backend="gloo",
+        init_method="file://{}".format(init_path),
+        rank=rank,
+        world_size=N_PROCESS,
+    )
+
+
+def train_pose_model(rank, init_path):
+    init_process_group(rank, init_path)
+
+    torch.manual_seed(rank)
+
+    model = PoseNetModel(
+        encoder_type="resnet18", distributed=True, device=torch.device("cpu")
+    )
+    model.train()
+
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+
+    for _ in range(N_STEP):
+        image0 = torch.rand(2, 3, 64, 96)
+        image1 = torch.rand(2, 3, 64, 96)
+
+        loss = model.forward(image0, image1).abs().mean()
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+    torch.distributed.destroy_process_group()
+
+
+def train_depth_model(rank, init_path):
+    from kbnet.kbnet_model import KBNetModel
+
+    init_process_group(rank, init_path)
+
+    torch.manual_seed(rank)
+
+    model = KBNetModel(
+        input_channels_image=3,
+        input_channels_depth=2,
+        min_pool_sizes_sparse_to_dense_pool=[5, 7],
+        max_pool_sizes_sparse_to_dense_pool=[3, 5],
+        n_convolution_sparse_to_dense_pool=3,
+        n_filter_sparse_to_dense_pool=8,
+        n_filters_encoder_image=[8, 8, 8, 8, 8],
+        n_filters_encoder_depth=[4, 4, 4, 4, 4],
+        resolutions_backprojection=[0, 1, 2, 3],
+        n_filters_decoder=[16, 16, 8, 8, 8],
+        distributed=True,
+        device=torch.device("cpu"),
+    )
+    model.train()
+
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+
+    intrinsics = torch.tensor(
+        [[[40.0, 0.0, 48.0], [0.0, 40.0, 32.0], [0.0, 0.0, 1.0]]]
+    ).repeat(2, 1, 1)
+
+    for _ in range(N_STEP):
+        image = torch.rand(2, 3, 64, 96)
+        sparse_depth = torch.rand(2, 1, 64, 96)
+        validity_map = (sparse_depth > 0.5).float()
+
+        output_depth = model.forward(image, sparse_depth, validity_map, intrinsics)
+        loss = output_depth.mean()
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+    torch.distributed.destroy_process_group()
+
+
+def test_distributed_pose_model_multiple_steps(tmp_path):
+    torch.multiprocessing.spawn(
+        train_pose_model, args=(str(tmp_path / "init"),), nprocs=N_PROCESS
+    )
+
+
+def test_distributed_depth_model_multiple_steps(tmp_path):
+    pytest.importorskip("torchvision")
+
+    torch.multiprocessing.spawn(
+        train_depth_model, args=(str(tmp_path / "init"),), nprocs=N_PROCESS
+    )
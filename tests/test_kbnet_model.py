@@ -0,0 +1,40 @@
+import pytest
+import torch
+
+pytest.importorskip("torchvision")
+
+from kbnet.kbnet_model import KBNetModel
+
+
+def test_compile_decoder_matches_eager_forward():
+    model = KBNetModel(
+        input_channels_image=3,
+        input_channels_depth=2,
+        min_pool_sizes_sparse_to_dense_pool=[5, 7],
+        max_pool_sizes_sparse_to_dense_pool=[3, 5],
+        n_convolution_sparse_to_dense_pool=3,
+        n_filter_sparse_to_dense_pool=8,
+        n_filters_encoder_image=[8, 8, 8, 8, 8],
+        n_filters_encoder_depth=[4, 4, 4, 4, 4],
+        resolutions_backprojection=[0, 1, 2, 3],
+        n_filters_decoder=[16, 16, 8, 8, 8],
+        device=torch.device("cpu"),
+    )
+    model.eval()
+
+    image = torch.rand(2, 3, 64, 96)
+    sparse_depth = torch.rand(2, 1, 64, 96)
+    validity_map_depth = (sparse_depth > 0.5).float()
+    intrinsics = torch.tensor(
+        [[[40.0, 0.0, 48.0], [0.0, 40.0, 32.0], [0.0, 0.0, 1.0]]]
+    ).repeat(2, 1, 1)
+
+    inputs = (image, sparse_depth, validity_map_depth, intrinsics)
+
+    with torch.inference_mode():
+        output_depth = model.forward(*inputs)
+
+        model.compile_decoder(*inputs, mode="default")
+        output_depth_compiled = model.forward(*inputs)
+
+    assert torch.allclose(output_depth_compiled, output_depth, atol=1e-5)
@@ -0,0 +1,28 @@
+import torch
+from kbnet import net_utils
+
+
+def test_fuse_convolution_activation_only_replaces_relu_convolutions():
+    module = torch.nn.Sequential(
+        net_utils.Conv2d(3, 8, activation_func=torch.nn.ReLU()),
+        net_utils.Conv2d(8, 8, activation_func=torch.nn.LeakyReLU(0.2)),
+        net_utils.Conv2d(8, 8, activation_func=torch.nn.ReLU(), use_batch_norm=True),
+    )
+    module.eval()
+
+    x = torch.rand(2, 3, 16, 24)
+    keys = list(module.state_dict().keys())
+
+    with torch.no_grad():
+        output = module(x)
+
+    assert net_utils.fuse_convolution_activation(module) == 1
+    assert isinstance(module[0], net_utils.FusedConv2dReLU)
+    assert isinstance(module[1], net_utils.Conv2d)
+    assert isinstance(module[2], net_utils.Conv2d)
+
+    # Weights are shared, so checkpoints load into the fused module unchanged
+    assert list(module.state_dict().keys()) == keys
+
+    with torch.no_grad():
+        assert torch.allclose(module(x), output)
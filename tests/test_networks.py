@@ -0,0 +1,152 @@
+import pytest
+import torch
+from kbnet import networks
+
+
+def build_encoder(**kwargs):
+    return networks.KBNetEncoder(
+        input_channels_image=3,
+        input_channels_depth=2,
+        n_filters_image=[8, 8, 8, 8, 8],
+        n_filters_depth=[4, 4, 4, 4, 4],
+        n_filters_fused=[8, 8, 8, 8, 8],
+        resolutions_backprojection=[0, 1, 2, 3],
+        **kwargs,
+    )
+
+
+def build_inputs(n_batch=2, n_height=32, n_width=48):
+    image = torch.rand(n_batch, 3, n_height, n_width)
+    depth = torch.rand(n_batch, 2, n_height, n_width)
+    intrinsics = torch.tensor(
+        [[40.0, 0.0, n_width / 2.0], [0.0, 40.0, n_height / 2.0], [0.0, 0.0, 1.0]]
+    ).repeat(n_batch, 1, 1)
+
+    return image, depth, intrinsics
+
+
+def test_reuse_coordinates_buffers_two_forwards_one_backward():
+    encoder = build_encoder(reuse_coordinates_buffers=True)
+    image, depth, intrinsics = build_inputs()
+
+    latent0, _ = encoder(image, depth, intrinsics)
+    latent1, _ = encoder(image, depth, intrinsics)
+
+    # Second forward must not overwrite tensors saved for backward of the first
+    (latent0.sum() + latent1.sum()).backward()
+
+    assert len(encoder.coordinates_buffers) == 0
+
+
+def test_reuse_coordinates_buffers_inference_mode_then_no_grad():
+    encoder = build_encoder(reuse_coordinates_buffers=True)
+    reference = build_encoder()
+    reference.load_state_dict(encoder.state_dict())
+
+    image, depth, intrinsics = build_inputs()
+
+    with torch.inference_mode():
+        encoder(image, depth, intrinsics)
+
+    with torch.no_grad():
+        latent, _ = encoder(image, depth, intrinsics)
+        latent_reference, _ = reference(image, depth, intrinsics)
+
+    assert torch.allclose(latent, latent_reference)
+
+
+def test_camera_coordinates_follow_intrinsics():
+    encoder = build_encoder()
+    image, depth, intrinsics = build_inputs()
+    intrinsics_changed = intrinsics.clone()
+    intrinsics_changed[:, 0, 0] = 60.0
+
+    with torch.no_grad():
+        coordinates = encoder.camera_coordinates(
+            2, 32, 48, torch.linalg.inv(intrinsics)
+        )
+
+        # Pixel coordinates are cached by shape, camera coordinates are not
+        coordinates_changed = encoder.camera_coordinates(
+            2, 32, 48, torch.linalg.inv(intrinsics_changed)
+        )
+
+    assert len(encoder.meshgrid_cache) == 1
+
+    # Pixel (x, y) = (47, 0) is 23 pixels right of the principal point
+    assert torch.allclose(coordinates[:, 0, 0, 47], torch.tensor(23.0 / 40.0))
+    assert torch.allclose(coordinates_changed[:, 0, 0, 47], torch.tensor(23.0 / 60.0))
+
+
+def test_reuse_concat_buffers_inference_mode_then_no_grad():
+    decoder = networks.MultiScaleDecoder(
+        input_channels=32,
+        output_channels=1,
+        n_resolution=1,
+        n_filters=[32, 16, 16, 8, 8],
+        n_skips=[16, 16, 8, 8, 0],
+        deconv_type="up",
+        reuse_concat_buffers=True,
+    )
+
+    latent = torch.rand(2, 32, 2, 3)
+    skips = [
+        torch.rand(2, 8, 32, 48),
+        torch.rand(2, 8, 16, 24),
+        torch.rand(2, 16, 8, 12),
+        torch.rand(2, 16, 4, 6),
+    ]
+
+    with torch.inference_mode():
+        output_inference = decoder(latent, skips, shape=(64, 96))[-1]
+
+    with torch.no_grad():
+        output = decoder(latent, skips, shape=(64, 96))[-1]
+
+    assert torch.allclose(output, output_inference)
+
+
+def test_to_traced_matches_eager_and_rejects_coordinates_buffers():
+    encoder = build_encoder()
+    encoder.eval()
+
+    image, depth, intrinsics = build_inputs()
+
+    with torch.no_grad():
+        traced = encoder.to_traced(image, depth, intrinsics)
+        latent, _ = encoder(image, depth, intrinsics)
+        latent_traced, _ = traced(image, depth, intrinsics)
+
+    assert torch.allclose(latent, latent_traced)
+
+    encoder.reuse_coordinates_buffers = True
+
+    with pytest.raises(AssertionError):
+        encoder.to_traced(image, depth, intrinsics)
+
+
+def test_decoder_compile_for_shape_matches_eager():
+    encoder = build_encoder()
+    encoder.eval()
+
+    decoder = networks.MultiScaleDecoder(
+        input_channels=12,
+        output_channels=1,
+        n_resolution=1,
+        n_filters=[16, 16, 8, 8, 8],
+        n_skips=[12, 12, 12, 12, 0],
+        deconv_type="up",
+    )
+    decoder.eval()
+
+    image, depth, intrinsics = build_inputs()
+    shape = image.shape[-2:]
+
+    with torch.inference_mode():
+        latent, skips = encoder(image, depth, intrinsics)
+        output = decoder(latent, skips, shape)[-1]
+
+        decoder.compile_for_shape(latent, skips, shape=shape, mode="default")
+        output_compiled = decoder(latent, skips, shape)[-1]
+
+    assert torch.allclose(output_compiled, output, atol=1e-5)
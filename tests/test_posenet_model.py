@@ -0,0 +1,46 @@
+import re
+import torch
+from kbnet.posenet_model import PoseNetModel
+
+
+def test_restore_checkpoint_with_old_keys_into_scripted_encoder(tmp_path):
+    device = torch.device("cpu")
+
+    model = PoseNetModel(encoder_type="posenet", device=device)
+
+    # Checkpoints saved before convolutions were held in a container
+    encoder_state_dict = {
+        re.sub(
+            r"convs\.(\d+)\.",
+            lambda match: "conv{}.".format(int(match.group(1)) + 1),
+            key,
+        ): value
+        for key, value in model.encoder.state_dict().items()
+    }
+
+    checkpoint_path = str(tmp_path / "pose_model.pth")
+    torch.save(
+        {
+            "train_step": 0,
+            "encoder_state_dict": encoder_state_dict,
+            "decoder_state_dict": model.decoder.state_dict(),
+        },
+        checkpoint_path,
+    )
+
+    model_scripted = PoseNetModel(
+        encoder_type="posenet", use_torchscript=True, device=device
+    )
+    model_scripted.restore_model(checkpoint_path)
+
+    model.eval()
+    model_scripted.eval()
+
+    image0 = torch.rand(2, 3, 64, 96)
+    image1 = torch.rand(2, 3, 64, 96)
+
+    with torch.no_grad():
+        pose = model.forward(image0, image1)
+        pose_scripted = model_scripted.forward(image0, image1)
+
+    assert torch.allclose(pose, pose_scripted)